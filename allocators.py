@@ -0,0 +1,72 @@
+"""
+Регистрация распределителей из скриптов корня в реестре util.ALLOCATORS.
+
+После импорта этого модуля все методы доступны через util.allocate
+с единой сигнатурой fn(c, B, L, A, **kwargs) и общим AllocationResult:
+
+    from allocators import allocate
+    result = allocate("distribute_budget_L1_lp", c, B, L, A)
+    print(result.rmse)
+"""
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
+
+from util import ALLOCATORS, AllocationResult, allocate, register_allocator
+from g import allocate_budget_L2
+from j import distribute_budget_L1
+from lp import _solve_L1_lp
+from main2 import distribute_budget_biobj
+from main3 import distribute_budget_lexico
+from paretto import pareto_front
+from q import distribute_budget_qp
+
+
+@register_allocator("distribute_budget_biobj")
+def _biobj(c, B, L, A, lambd=1.0):
+    z, rmse, used = distribute_budget_biobj(A, c, B, L=L, lambd=lambd)
+    return z, {"used": used}
+
+
+@register_allocator("distribute_budget_lexico")
+def _lexico(c, B, L, A, epsilon=1e-3, mode="penalty"):
+    _, z2, metrics = distribute_budget_lexico(A, c, B, L=L, epsilon=epsilon, mode=mode)
+    return z2, metrics
+
+
+@register_allocator("distribute_budget_L1_lp")
+def _L1_lp(c, B, L, A):
+    res = _solve_L1_lp(A, c, B, L)
+    if not res.success:
+        return None
+    m = A.shape[1]
+    return res.x[:m], {"eps": res.x[m:], "iterations": res.nit}
+
+
+@register_allocator("allocate_budget_L2")
+def _L2(c, B, L, A, p=None):
+    return allocate_budget_L2(c / c.sum(), A, B, L=L, p=p)
+
+
+@register_allocator("distribute_budget_qp")
+def _qp(c, B, L, A):
+    return distribute_budget_qp(c, A, B, L=L)
+
+
+@register_allocator("distribute_budget_L1")
+def _L1(c, B, L, A, w=None, p=None):
+    return distribute_budget_L1(c, A, B, L=L, w=w, p=p)
+
+
+@register_allocator("pareto_front")
+def _pareto(c, B, L, A, w=None, num_points=10):
+    """Точка фронта с наибольшим весом покрытия; весь фронт — в info"""
+    m = A.shape[1]
+    w = np.ones(m) / m if w is None else w
+    front = pareto_front(A, c / c.sum() * B, B, L, w, num_points=num_points)
+    if front.empty:
+        return None
+    return front.iloc[-1]["x_values"], {"front": front}
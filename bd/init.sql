@@ -31,10 +31,20 @@ create table if not exists foundation
 
 create table if not exists foundation_report
 (
-    id         serial primary key,
-    created_at timestamp with time zone default now()
+    id                serial primary key,
+    created_at        timestamp with time zone default now(),
+    problem_report_id int,
+    method            varchar
 );
 
+-- для баз, созданных до появления связи с problem_report
+alter table foundation_report add column if not exists problem_report_id int;
+alter table foundation_report add column if not exists method varchar;
+
+-- одно распределение на пару (отчет, метод): повторная запись обновляет его
+create unique index if not exists foundation_report_problem_method
+    on foundation_report (problem_report_id, method);
+
 create table if not exists foundation_item
 (
     id        serial primary key,
@@ -45,6 +55,9 @@ create table if not exists foundation_item
     constraint fk_foundationitem_foundation foreign key (report_id) references foundation_report (id)
 );
 
+create unique index if not exists foundation_item_report_item
+    on foundation_item (report_id, item_id);
+
 create table if not exists item
 (
     id      serial primary key,
@@ -0,0 +1,171 @@
+"""
+Бенчмарк всех методов распределения бюджета на синтетических задачах.
+
+Для каждой пары (метод, размер) пишет время, пиковую память, число итераций
+солвера (если метод его сообщает) и качество решения в JSON-файл, который
+можно сравнивать между версиями:
+
+    python bench.py --out bench_results.json
+    python bench.py --sizes 6x15 100x50 --methods distribute_budget distribute_budget_L1_lp
+    python bench.py --compare old_results.json
+"""
+import argparse
+import json
+import platform
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import numpy as np
+import scipy.sparse as sp
+
+from allocators import allocate
+
+# (n проблем, m статей, доля ненулевых связей)
+SIZES = {
+    "6x15": (6, 15, 0.3),
+    "10x15": (10, 15, 0.3),
+    "100x50": (100, 50, 0.1),
+    "1000x200": (1000, 200, 0.02),
+    "10000x1000": (10000, 1000, 0.002),
+}
+
+
+def make_problem(n, m, density, seed=0, B=10 ** 6):
+    """
+    Синтетическая задача (c, A, L, B) в духе данных из БД:
+    частоты упоминаний — счетчики, эффективности связей — из [0, 1],
+    у каждой проблемы есть хотя бы одна статья, L = B / m / 5.
+    """
+    rng = np.random.default_rng(seed)
+
+    A = sp.random(n, m, density=density, random_state=rng, format="lil")
+    rows = np.flatnonzero(A.getnnz(axis=1) == 0)
+    A[rows, rng.integers(0, m, len(rows))] = rng.random(len(rows))
+    A = A.toarray()
+
+    c = rng.integers(1, 500, n).astype(float)
+    L = np.full(m, B / m / 5)
+    return c, A, L, float(B)
+
+
+# имя в бенчмарке -> (метод реестра, его параметры, наибольший n·m, для которого его разумно запускать)
+METHODS = {
+    "distribute_budget": ("distribute_budget", {}, 10 ** 7),
+    "distribute_budget_presolved": ("distribute_budget_presolved", {}, 10 ** 7),
+    "distribute_budget_fista": ("distribute_budget", {"solver": "fista"}, 10 ** 7),
+    "distribute_budget_osqp": ("distribute_budget", {"solver": "OSQP"}, 2 * 10 ** 5),
+    "dp_budget_allocation": ("dp_budget_allocation", {"K": 10 ** 4}, 10 ** 7),
+    "greedy_budget_allocation": ("greedy_budget_allocation", {"K": 10 ** 4}, 10 ** 7),
+    # жадная эвристика без старта с QP: на 6x15 цель в 30 раз выше оптимума, на 10x15 — на 38%
+    "greedy_coupled": ("greedy_budget_allocation", {"K": 10 ** 4, "coupled": True}, 2 * 10 ** 5),
+    "rounded_budget_allocation": ("rounded_budget_allocation", {"K": 10 ** 4}, 2 * 10 ** 5),
+    "scaled_target_allocation": ("scaled_target_allocation", {"lambda_reg": 0.1}, 10 ** 7),
+    "distribute_budget_biobj": ("distribute_budget_biobj", {"lambd": 1.0}, 2 * 10 ** 5),
+    "distribute_budget_lexico": ("distribute_budget_lexico", {"epsilon": 1e-3}, 2 * 10 ** 5),
+    "distribute_budget_L1_lp": ("distribute_budget_L1_lp", {}, 10 ** 7),
+    "allocate_budget_L2": ("allocate_budget_L2", {}, 2 * 10 ** 5),
+    "distribute_budget_qp": ("distribute_budget_qp", {}, 2 * 10 ** 5),
+    "distribute_budget_L1": ("distribute_budget_L1", {}, 2 * 10 ** 5),
+    "pareto_front": ("pareto_front", {}, 10 ** 4),
+}
+
+
+def solution_quality(result, L, B):
+    """Качество распределения: ошибки покрытия и нарушение ограничений"""
+    x = np.asarray(result.x, float)
+    return {
+        "mae": float(result.mae),
+        "rmse": float(result.rmse),
+        "r2": float(result.r2),
+        "budget_violation": float(abs(x.sum() - B)),
+        "lower_violation": float(max(np.max(L - x), 0.0)),
+    }
+
+
+def run_case(name, size, problem, repeat):
+    """Замер одного метода на одной задаче: лучшее время из repeat, память — отдельным прогоном"""
+    method, kwargs, _ = METHODS[name]
+    c, A, L, B = problem
+
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = allocate(method, c, B, L, A, **kwargs)
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    allocate(method, c, B, L, A, **kwargs)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    record = {
+        "method": name,
+        "size": size,
+        "wall_time_s": min(times),
+        "peak_memory_bytes": peak,
+        "iterations": (result.info or {}).get("iterations") if result is not None else None,
+        "status": "ok" if result is not None else "failed",
+    }
+    if result is not None:
+        record.update(solution_quality(result, L, B))
+    return record
+
+
+def run_benchmark(sizes, methods, repeat=3, seed=0):
+    records = []
+    for size in sizes:
+        n, m, density = SIZES[size]
+        problem = make_problem(n, m, density, seed)
+        for name in methods:
+            if n * m > METHODS[name][2]:
+                records.append({"method": name, "size": size, "status": "skipped"})
+                continue
+            try:
+                record = run_case(name, size, problem, repeat)
+            except Exception as e:
+                record = {"method": name, "size": size, "status": "error", "error": repr(e)}
+            records.append(record)
+            print(f"{size:>11} {name:>25}: {record.get('wall_time_s', float('nan')):.4f} s  {record['status']}")
+    return records
+
+
+def compare(records, baseline):
+    """Отношение времени к прошлому прогону по совпадающим (метод, размер)"""
+    old = {(r["method"], r["size"]): r for r in baseline if r["status"] == "ok"}
+    for r in records:
+        prev = old.get((r["method"], r["size"]))
+        if r["status"] == "ok" and prev is not None:
+            ratio = r["wall_time_s"] / prev["wall_time_s"]
+            print(f"{r['size']:>11} {r['method']:>25}: x{ratio:.2f} времени, "
+                  f"rmse {prev['rmse']:.4g} -> {r['rmse']:.4g}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", nargs="+", default=list(SIZES), choices=list(SIZES))
+    parser.add_argument("--methods", nargs="+", default=list(METHODS), choices=list(METHODS))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default="bench_results.json")
+    parser.add_argument("--compare", help="JSON прошлого прогона для сравнения")
+    args = parser.parse_args()
+
+    records = run_benchmark(args.sizes, args.methods, args.repeat, args.seed)
+
+    result = {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "seed": args.seed,
+        "repeat": args.repeat,
+        "results": records,
+    }
+    with open(args.out, "w") as f:
+        json.dump(result, f, indent=2)
+    print(f"Результаты записаны в {args.out}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(records, json.load(f)["results"])
@@ -110,7 +110,9 @@ ALTER SEQUENCE public.foundation_item_id_seq OWNED BY public.foundation_item.id;
 
 CREATE TABLE public.foundation_report (
     id integer NOT NULL,
-    created_at timestamp with time zone DEFAULT now()
+    created_at timestamp with time zone DEFAULT now(),
+    problem_report_id integer,
+    method character varying
 );
 
 
@@ -742,6 +744,20 @@ ALTER TABLE ONLY public.problem_report
     ADD CONSTRAINT problem_report_pkey PRIMARY KEY (id);
 
 
+--
+-- Name: foundation_item_report_item; Type: INDEX; Schema: public; Owner: ivan
+--
+
+CREATE UNIQUE INDEX foundation_item_report_item ON public.foundation_item USING btree (report_id, item_id);
+
+
+--
+-- Name: foundation_report_problem_method; Type: INDEX; Schema: public; Owner: ivan
+--
+
+CREATE UNIQUE INDEX foundation_report_problem_method ON public.foundation_report USING btree (problem_report_id, method);
+
+
 --
 -- Name: problem_budget_link fk_budget_item; Type: FK CONSTRAINT; Schema: public; Owner: ivan
 --
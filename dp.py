@@ -1,113 +1,154 @@
 import numpy as np
 from scipy.optimize import linprog
 
-# Параметры задачи (примерные данные)
-B = 1000  # Общий бюджет
-c = np.array([3, 2, 4])  # Важность проблем (n=3)
-l = np.array([100, 150, 80, 120])  # Минимальные бюджеты статей (m=4)
-
-# Матрица влияния статей на проблемы (m x n)
-A = np.array([
-    [0.7, 0.2, 0.4],  # Статья 0
-    [0.3, 0.6, 0.5],  # Статья 1
-    [0.5, 0.4, 0.8],  # Статья 2
-    [0.2, 0.9, 0.1]   # Статья 3
-])
-
-# 1. Рассчет весов для статей
-weights = A @ c  # Вектор весов размерности m
-
-# 2. Проверка выполнимости ограничений
-if sum(l) > B:
-    raise ValueError(f"Сумма минимальных бюджетов ({sum(l)}) превышает общий бюджет ({B})")
-
-# 3. Формулировка задачи линейного программирования
-# Целевая функция: минимизация отрицательного эффекта (эквивалент максимизации)
-c_obj = -weights  # Преобразование для минимизации
-
-# Ограничения:
-# Бюджетное ограничение: sum(x) <= B
-A_ub = np.ones((1, len(l)))  # Матрица коэффициентов [1, 1, ..., 1]
-b_ub = [B]                   # Правая часть ограничения
-
-# Границы переменных: x_j >= l_j
-bounds = [(low, None) for low in l]
-
-# 4. Решение задачи
-result = linprog(
-    c=c_obj,
-    A_ub=A_ub,
-    b_ub=b_ub,
-    bounds=bounds,
-    method='highs'  # Эффективный метод для больших задач
-)
-
-# 5. Анализ результатов
-if not result.success:
-    raise RuntimeError(f"Оптимизация не удалась: {result.message}")
-
-optimal_budgets = result.x
-total_effect = -result.fun  # Преобразуем обратно к положительному эффекту
-used_budget = sum(optimal_budgets)
-
-# 6. Визуализация результатов
-print("\nОптимальное распределение бюджета:")
-print("---------------------------------")
-print(f"Общий бюджет: {B:.1f}")
-print(f"Использовано: {used_budget:.1f}")
-print(f"Суммарный эффект: {total_effect:.2f}\n")
-
-print("Детали по статьям:")
-print("Статья | Мин. бюджет | Выделено | Вес статьи")
-for j in range(len(l)):
-    print(f"{j:6} | {l[j]:11.1f} | {optimal_budgets[j]:8.1f} | {weights[j]:.2f}")
-
-# Проверка влияния на проблемы
-problem_effects = A.T @ optimal_budgets
-print("\nВлияние на проблемы:")
-print("Проблема | Важность | Полученный эффект")
-for i in range(len(c)):
-    print(f"{i:7} | {c[i]:8} | {problem_effects[i]:15.2f}"),
+
+def knapsack_allocation(weights, B, l, u=None):
+    """
+    Распределение, максимизирующее суммарный эффект weights @ x
+    при sum(x) <= B и l <= x <= u — дробный рюкзак.
+
+    Сначала каждой статье выделяется минимум l, затем остаток B - sum(l)
+    отдается статьям по убыванию веса, каждой — до ее потолка u
+    (без потолков весь остаток получает статья с наибольшим весом).
+    Статьи с неположительным весом сверх минимума не получают ничего.
+    Сортировка — O(m log m) вместо решения LP.
+
+    weights, l, u могут быть пачками сценариев формы (S, m), B — скаляр
+    или вектор длины S: все сценарии решаются одной сортировкой по строкам.
+    """
+    weights = np.asarray(weights, dtype=float)
+    l = np.broadcast_to(np.asarray(l, dtype=float), weights.shape)
+    u = np.full(weights.shape, np.inf) if u is None else np.broadcast_to(np.asarray(u, dtype=float), weights.shape)
+    B = np.asarray(B, dtype=float)
+
+    residual = B - l.sum(axis=-1)
+    if np.any(residual < 0):
+        raise ValueError(f"Сумма минимальных бюджетов превышает общий бюджет ({B})")
+
+    order = np.argsort(-weights, axis=-1, kind="stable")
+    room = np.take_along_axis(u - l, order, axis=-1)
+    room = np.where(np.take_along_axis(weights, order, axis=-1) > 0, room, 0.0)
+
+    # сколько остатка уже разобрано статьями с большим весом
+    # (без вычитания room из cumsum: у статей без потолка room = inf)
+    before = np.cumsum(room, axis=-1)
+    before = np.concatenate([np.zeros_like(before[..., :1]), before[..., :-1]], axis=-1)
+    take = np.clip(residual[..., None] - before, 0.0, room)
+
+    x = l.copy()
+    np.put_along_axis(x, order, np.take_along_axis(x, order, axis=-1) + take, axis=-1)
+    return x
 
 
 def evaluate_solution(optimal_budgets, B, l, c, A, weights):
+    """
+    Метрики распределения. Все аргументы могут быть пачками сценариев:
+    optimal_budgets и weights формы (S, m), c формы (S, n), B — вектор длины S;
+    тогда каждая метрика — массив длины S.
+    """
+    x = np.asarray(optimal_budgets, dtype=float)
+    weights = np.asarray(weights, dtype=float)
+    B = np.asarray(B, dtype=float)
+
     # 1. Проверка ограничений
-    constraints_ok = True
-    if sum(optimal_budgets) > B + 1e-5:
-        constraints_ok = False
-    if any(optimal_budgets < l - 1e-5):
-        constraints_ok = False
+    constraints_ok = ~((x.sum(axis=-1) > B + 1e-5) | np.any(x < l - 1e-5, axis=-1))
 
     # 2. Расчет эффектов
-    total_effect = np.dot(weights, optimal_budgets)
-    problem_effects = A.T @ optimal_budgets
+    total_effect = np.sum(weights * x, axis=-1)
+    problem_effects = x @ A
 
     # 3. Метрики эффективности
-    efficiency = total_effect / sum(optimal_budgets)
-    baseline = np.dot(weights, l)
-    improvement = (total_effect - baseline) / baseline if baseline > 0 else 0
+    efficiency = total_effect / x.sum(axis=-1)
+    baseline = np.sum(weights * l, axis=-1)
+    improvement = np.where(baseline > 0, (total_effect - baseline) / np.where(baseline > 0, baseline, 1), 0)
 
     # 4. Метрики справедливости
-    min_effect = min(problem_effects)
+    min_effect = problem_effects.min(axis=-1)
     rel_effects = problem_effects / c
 
     # 5. Сравнительные метрики
-    uniform_budgets = np.full(len(l), B / len(l))
-    uniform_effect = np.dot(weights, uniform_budgets)
+    uniform_effect = weights.sum(axis=-1) * B / x.shape[-1]
 
     return {
-        "constraints_satisfied": constraints_ok,
-        "total_effect": total_effect,
-        "efficiency_per_unit": efficiency,
-        "improvement_vs_baseline": improvement,
-        "min_effect": min_effect,
-        "min_effect_relative": min(rel_effects),
-        "uniform_comparison": total_effect / uniform_effect,
-        "problem_coverage": np.mean(rel_effects > 0.5)
+        "constraints_satisfied": constraints_ok.item() if constraints_ok.ndim == 0 else constraints_ok,
+        "total_effect": total_effect[()],
+        "efficiency_per_unit": efficiency[()],
+        "improvement_vs_baseline": improvement[()],
+        "min_effect": min_effect[()],
+        "min_effect_relative": rel_effects.min(axis=-1)[()],
+        "uniform_comparison": (total_effect / uniform_effect)[()],
+        "problem_coverage": np.mean(rel_effects > 0.5, axis=-1)[()]
     }
 
 
-# Запуск оценки
-metrics = evaluate_solution(optimal_budgets, B, l, c, A, weights)
-
-print(metrics)
\ No newline at end of file
+if __name__ == "__main__":
+    # Параметры задачи (примерные данные)
+    B = 1000  # Общий бюджет
+    c = np.array([3, 2, 4])  # Важность проблем (n=3)
+    l = np.array([100, 150, 80, 120])  # Минимальные бюджеты статей (m=4)
+
+    # Матрица влияния статей на проблемы (m x n)
+    A = np.array([
+        [0.7, 0.2, 0.4],  # Статья 0
+        [0.3, 0.6, 0.5],  # Статья 1
+        [0.5, 0.4, 0.8],  # Статья 2
+        [0.2, 0.9, 0.1]   # Статья 3
+    ])
+
+    # 1. Рассчет весов для статей
+    weights = A @ c  # Вектор весов размерности m
+
+    # 2. Проверка выполнимости ограничений
+    if sum(l) > B:
+        raise ValueError(f"Сумма минимальных бюджетов ({sum(l)}) превышает общий бюджет ({B})")
+
+    # 3. Решение: дробный рюкзак вместо linprog
+    optimal_budgets = knapsack_allocation(weights, B, l)
+
+    # Сверка с задачей линейного программирования
+    result = linprog(
+        c=-weights,
+        A_ub=np.ones((1, len(l))),
+        b_ub=[B],
+        bounds=[(low, None) for low in l],
+        method='highs'
+    )
+    if not result.success:
+        raise RuntimeError(f"Оптимизация не удалась: {result.message}")
+    assert np.isclose(weights @ optimal_budgets, -result.fun)
+
+    total_effect = weights @ optimal_budgets
+    used_budget = sum(optimal_budgets)
+
+    # 4. Визуализация результатов
+    print("\nОптимальное распределение бюджета:")
+    print("---------------------------------")
+    print(f"Общий бюджет: {B:.1f}")
+    print(f"Использовано: {used_budget:.1f}")
+    print(f"Суммарный эффект: {total_effect:.2f}\n")
+
+    print("Детали по статьям:")
+    print("Статья | Мин. бюджет | Выделено | Вес статьи")
+    for j in range(len(l)):
+        print(f"{j:6} | {l[j]:11.1f} | {optimal_budgets[j]:8.1f} | {weights[j]:.2f}")
+
+    # Проверка влияния на проблемы
+    problem_effects = A.T @ optimal_budgets
+    print("\nВлияние на проблемы:")
+    print("Проблема | Важность | Полученный эффект")
+    for i in range(len(c)):
+        print(f"{i:7} | {c[i]:8} | {problem_effects[i]:15.2f}"),
+
+    # Запуск оценки
+    metrics = evaluate_solution(optimal_budgets, B, l, c, A, weights)
+
+    print(metrics)
+
+    # Пачка сценариев "что если": случайные важности проблем
+    rng = np.random.default_rng(0)
+    C = rng.integers(1, 6, size=(10 ** 5, len(c)))
+    W = C @ A.T
+    X = knapsack_allocation(W, B, l, u=l + 400)
+    batch = evaluate_solution(X, np.full(len(C), B), l, C, A, W)
+    print(f"\n{len(C)} сценариев: средний эффект {batch['total_effect'].mean():.2f}, "
+          f"ограничения выполнены во всех: {batch['constraints_satisfied'].all()}")
@@ -1,6 +1,12 @@
-import cvxpy as cp
+import os
+import sys
+
 import numpy as np
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
+
+from util import scaled_target_allocation, scaled_target_path
+
 # Генерация тестовых данных
 np.random.seed(42)
 n, m = 5, 6  # 5 проблем, 10 статей
@@ -26,37 +32,20 @@ A = np.array([
 # Проверка выполнимости
 assert sum(l) <= B, "Нерешаемо: min бюджеты > общего бюджета"
 
-# 1. Определение переменных
-x = cp.Variable(m)  # Бюджеты статей
-k = cp.Variable()   # Масштабирующий коэффициент
-
-# 2. Параметры регуляризации
+# 1. Параметры регуляризации
 lambda_reg = 0.1    # Коэф. регуляризации
 k_min = B / sum(c)  # Минимальное значение k
 
-# 3. Формулировка задачи
-objective = cp.Minimize(
-    cp.sum_squares(A.T @ x - k * c) +
-    lambda_reg * cp.sum_squares(x)
-)
-
-constraints = [
-    cp.sum(x) == B,
-    x >= l,
-    k >= k_min
-]
-
-problem = cp.Problem(objective, constraints)
-problem.solve(solver=cp.ECOS, verbose=False)
-# problem.solve()
+# 2. Решение: min ||A.T x - k c||^2 + lambda_reg ||x||^2
+#    при sum(x) == B, x >= l, k >= k_min; k исключается в замкнутом виде
+solved = scaled_target_allocation(c, B, l, A.T, lambda_reg=lambda_reg, k_min=k_min)
 
-# 4. Анализ результатов
-if problem.status not in ["optimal", "optimal_inaccurate"]:
-    raise ValueError(f"Решение не найдено: {problem.status}")
+# 3. Анализ результатов
+if solved is None:
+    raise ValueError("Решение не найдено")
 
 # Расчет эффектов
-optimal_x = x.value
-optimal_k = k.value
+optimal_x, optimal_k = solved[:2]
 effect = A.T @ optimal_x
 desired_effect = optimal_k * c
 
@@ -82,4 +71,11 @@ for i in range(n):
     print(f'budget effect = {b_eff[i]}')
 
 print(f'mse = {mse}')
-print(f'rmse = {rmse}')
\ No newline at end of file
+print(f'rmse = {rmse}')
+
+# 6. Чувствительность к регуляризации: все lambda_reg одним проходом
+lambdas = np.logspace(-3, 3, 7)
+X, ks = scaled_target_path(c, B, l, A.T, lambdas, k_min=k_min)
+print("\nlambda_reg | k | x")
+for lam, k, x_lam in zip(lambdas, ks, X):
+    print(f"{lam:10.3g} | {k:.3f} | {np.round(x_lam, 1)}")
@@ -1,6 +1,39 @@
+from functools import lru_cache
+
 import numpy as np
 import cvxpy as cp
 
+
+@lru_cache(maxsize=32)
+def _compiled_L2(n, m):
+    """
+    Параметризованная задача allocate_budget_L2 для размерности (n, m).
+    B, L — cp.Parameter, канонизация выполняется один раз.
+    Веса p внесены в данные (Ap = sqrt(p)·A, yp = sqrt(p)·y),
+    иначе произведение p на невязку нарушает правила DPP.
+    """
+    x = cp.Variable(m)
+    params = {
+        "Ap": cp.Parameter((n, m)),
+        "yp": cp.Parameter(n),
+        "B": cp.Parameter(),
+        "L": cp.Parameter(m),
+    }
+
+    # Функция цели: взвешенные квадраты ошибок
+    # sum p_i (A x - y)_i^2 = ||sqrt(p)·(A x - y)||^2
+    residuals = params["Ap"] @ x - params["yp"]
+    objective = cp.Minimize(cp.sum_squares(residuals))
+
+    # Ограничения
+    constraints = [
+        cp.sum(x) == params["B"],
+        x >= params["L"],
+    ]
+
+    return cp.Problem(objective, constraints), x, params
+
+
 def allocate_budget_L2(w, A, B, L=None, p=None):
     """
     Распределение бюджета по L2‑критерию (взвешенные квадраты).
@@ -26,24 +59,18 @@ def allocate_budget_L2(w, A, B, L=None, p=None):
     # Целевые расходы по проблемам
     y = w * B
 
-    # Переменная оптимизации
-    x = cp.Variable(m)
-
-    # Функция цели: взвешенные квадраты ошибок
-    residuals = A @ x - y
-    objective = cp.Minimize(cp.sum(cp.multiply(p, cp.square(residuals))))
-
-    # Ограничения
-    constraints = [
-        cp.sum(x) == B,
-        x >= L,
-    ]
+    # Задача из кэша: канонизация один раз на размерность
+    prob, x, params = _compiled_L2(n, m)
+    sqrt_p = np.sqrt(p)
+    params["Ap"].value = sqrt_p[:, None] * A
+    params["yp"].value = sqrt_p * y
+    params["B"].value = B
+    params["L"].value = L
 
-    # Решаем QP
-    prob = cp.Problem(objective, constraints)
-    prob.solve(solver=cp.OSQP)
+    # Решаем QP, стартуя с предыдущего решения
+    prob.solve(solver=cp.OSQP, warm_start=True)
 
-    x_opt = x.value
+    x_opt = x.value.copy()
 
     # Вычисляем ошибки
     e = A @ x_opt - y
@@ -1,7 +1,81 @@
+import highspy
 import numpy as np
-import cvxpy as cp
+import scipy.sparse as sp
 
-def distribute_budget_L1(c, A, B, L=None, w=None, p=None):
+
+def _l1_model(A, y, B, L, p):
+    """
+    LP взвешенной L1-задачи в разреженном виде для HiGHS.
+
+    Невязка расщепляется на части: A x - u + v = y, u, v >= 0, и |e_i| = u_i + v_i
+    в оптимуме, поэтому вместо 2n неравенств с двумя плотными блоками
+    остаются n равенств [A, -I, I] и строка бюджета.
+    Столбцы: x (m), u (n), v (n).
+    """
+    n, m = A.shape
+    M = sp.vstack([
+        sp.hstack([sp.csr_matrix(A), -sp.identity(n), sp.identity(n)]),
+        sp.hstack([sp.csr_matrix(np.ones((1, m))), sp.csr_matrix((1, 2 * n))]),
+    ], format="csc")
+    rhs = np.append(y, B)
+
+    lp = highspy.HighsLp()
+    lp.num_col_ = m + 2 * n
+    lp.num_row_ = n + 1
+    lp.col_cost_ = np.concatenate([np.zeros(m), p, p])
+    lp.col_lower_ = np.concatenate([np.maximum(L, 0.0), np.zeros(2 * n)])
+    lp.col_upper_ = np.full(m + 2 * n, highspy.kHighsInf)
+    lp.row_lower_ = rhs
+    lp.row_upper_ = rhs
+    lp.a_matrix_.format_ = highspy.MatrixFormat.kColwise
+    lp.a_matrix_.start_ = M.indptr
+    lp.a_matrix_.index_ = M.indices
+    lp.a_matrix_.value_ = M.data
+    return lp
+
+
+def _highs():
+    """HiGHS с симплексом: вершинные решения и теплый старт по базису"""
+    h = highspy.Highs()
+    h.setOptionValue("output_flag", False)
+    h.setOptionValue("solver", "simplex")
+    return h
+
+
+def _solve_l1(h, m):
+    """Запускает HiGHS; распределение x либо None, если LP не решена"""
+    h.run()
+    if h.getModelStatus() != highspy.HighsModelStatus.kOptimal:
+        return None
+    return np.array(h.getSolution().col_value[:m])
+
+
+def _l1_metrics(A, x_opt, y, p):
+    e = (A @ x_opt) - y   # ошибки по проблемам, размер n
+
+    # Метрики качества
+    SAE   = np.sum(np.abs(e))
+    MAE   = np.mean(np.abs(e))
+    RMSE  = np.sqrt(np.mean(e**2))
+    MAEp  = np.sum(p * np.abs(e))
+    RMSEp = np.sqrt(np.sum(p * e**2))
+
+    # R^2
+    SS_res = np.sum(e**2)
+    SS_tot = np.sum((y - y.mean())**2)
+    R2     = 1 - SS_res/SS_tot if SS_tot>0 else np.nan
+
+    return {
+        'SAE':   SAE,
+        'MAE':   MAE,
+        'RMSE':  RMSE,
+        'MAEp':  MAEp,
+        'RMSEp': RMSEp,
+        'R2':    R2
+    }
+
+
+def distribute_budget_L1(c, A, B, L=None, w=None, p=None, basis=None, return_basis=False):
     """
     Распределение бюджета методом L1 (минимизация суммы абсолютных отклонений).
 
@@ -12,11 +86,18 @@ def distribute_budget_L1(c, A, B, L=None, w=None, p=None):
       L (np.array[m])      : нижние пороги по статьям (по умолчанию 0)
       w (np.array[m])      : приоритеты статей (используются только для регуляризации; по умолчанию None)
       p (np.array[n])      : веса проблем (по умолчанию равномерные)
+      basis                : базис HiGHS предыдущего решения той же размерности (теплый старт)
+      return_basis (bool)  : вернуть также базис для следующего решения
+
+    LP решается симплексом HiGHS (см. _l1_model), поэтому решение —
+    точная вершина, а не приближение QP-солвера.
 
     Возвращает:
       x_opt (np.array[m])  : оптимальное распределение бюджета
       metrics (dict)       : {'R2','MAE','RMSE','MAEp','RMSEp','SAE'}
                              где SAE = суммарная абсолютная ошибка = sum |e_i|
+      (basis               : базис HiGHS, если return_basis=True)
+    либо None, если LP не решена.
     """
     # Размерности
     n, m = A.shape
@@ -28,52 +109,65 @@ def distribute_budget_L1(c, A, B, L=None, w=None, p=None):
     # Целевой вектор абсолютных расходов по проблемам
     y = (c / c.sum()) * B    # размер n
 
-    # Переменные: x_j >= 0  и  ε_i >= 0
-    x   = cp.Variable(m, nonneg=True)
-    eps = cp.Variable(n, nonneg=True)
+    h = _highs()
+    h.passModel(_l1_model(A, y, B, L, p))
+    if basis is not None:
+        h.setBasis(basis)
 
-    # Основная часть: для каждой проблемы |(A x)_i - y_i| <= ε_i
-    residuals = A @ x - y    # размер n
+    x_opt = _solve_l1(h, m)
+    if x_opt is None:
+        return None
 
-    constraints = [
-        cp.sum(x) == B,
-        x >= L,
-        residuals <=  eps,
-        -residuals <=  eps
-    ]
+    metrics = _l1_metrics(A, x_opt, y, p)
+    return (x_opt, metrics, h.getBasis()) if return_basis else (x_opt, metrics)
 
-    # Целевая функция: минимизировать взвешенную сумму ε_i
-    objective = cp.Minimize(cp.sum(cp.multiply(p, eps)))
 
-    # Решаем LP
-    prob = cp.Problem(objective, constraints)
-    prob.solve(solver=cp.OSQP)  # или любым LP‑солвером
+def distribute_budget_L1_weights(c, A, B, ps, L=None):
+    """
+    L1-распределение одного отчета для пачки весов проблем ps (список p).
 
-    x_opt = x.value
-    e     = (A @ x_opt) - y   # ошибки по проблемам, размер n
+    Модель передается в HiGHS один раз; для каждого p меняются только
+    стоимости столбцов u, v, и симплекс продолжает с базиса предыдущего решения.
 
-    # Метрики качества
-    SAE   = np.sum(np.abs(e))
-    MAE   = np.mean(np.abs(e))
-    RMSE  = np.sqrt(np.mean(e**2))
-    MAEp  = np.sum(p * np.abs(e))
-    RMSEp = np.sqrt(np.sum(p * e**2))
+    Возвращает список (x_opt, metrics) в порядке ps; None — если LP не решена.
+    """
+    n, m = A.shape
+    L = np.zeros(m) if L is None else L
+    y = (c / c.sum()) * B
+    cols = np.arange(m, m + 2 * n, dtype=np.int32)
 
-    # R^2
-    SS_res = np.sum(e**2)
-    SS_tot = np.sum((y - y.mean())**2)
-    R2     = 1 - SS_res/SS_tot if SS_tot>0 else np.nan
+    h = _highs()
+    h.passModel(_l1_model(A, y, B, L, np.ones(n) / n))
 
-    metrics = {
-        'SAE':   SAE,
-        'MAE':   MAE,
-        'RMSE':  RMSE,
-        'MAEp':  MAEp,
-        'RMSEp': RMSEp,
-        'R2':    R2
-    }
+    results = []
+    for p in ps:
+        h.changeColsCost(2 * n, cols, np.concatenate([p, p]))
+        x_opt = _solve_l1(h, m)
+        results.append(None if x_opt is None else (x_opt, _l1_metrics(A, x_opt, y, p)))
+    return results
+
+
+def distribute_budget_L1_batch(problems, B, L=None, p=None):
+    """
+    L1-распределение для пачки отчетов [(c, A), ...].
+
+    Отчет той же размерности, что и предыдущий, стартует с его базиса.
 
-    return x_opt, metrics
+    Возвращает список (x_opt, metrics) в порядке problems; None — если LP не решена.
+    """
+    results = []
+    basis, shape = None, None
+    for c, A in problems:
+        solved = distribute_budget_L1(c, A, B, L=L, p=p,
+                                      basis=basis if A.shape == shape else None,
+                                      return_basis=True)
+        if solved is None:
+            results.append(None)
+            continue
+        x_opt, metrics, basis = solved
+        shape = A.shape
+        results.append((x_opt, metrics))
+    return results
 
 # --- Пример использования ---
 if __name__ == "__main__":
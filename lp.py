@@ -1,6 +1,54 @@
+from functools import lru_cache
+
 import numpy as np
+import scipy.sparse as sp
 from scipy.optimize import linprog
 
+
+@lru_cache(maxsize=32)
+def _lp_structure(n, m):
+    """
+    Неизменная для размерности (n, m) часть LP:
+      c_vec = [0_m, 1_n],  блок [-I; -I] при eps,  A_eq = [1_m, 0_n].
+    Кэшируется, чтобы пачка отчетов одной размерности собиралась без повторов.
+    """
+    c_vec = np.hstack([np.zeros(m), np.ones(n)])
+    eps_block = sp.vstack([-sp.identity(n), -sp.identity(n)], format="csr")
+    A_eq = sp.csr_matrix(np.hstack([np.ones((1, m)), np.zeros((1, n))]))
+    return c_vec, eps_block, A_eq
+
+
+def _solve_L1_lp(A, v, B, L):
+    """Сборка и решение LP для одного отчета; возвращает результат linprog"""
+    n, m = A.shape
+    if L is None:
+        L = np.zeros(m)
+
+    # Целевая нагрузка по проблемам
+    y = (v / v.sum()) * B
+
+    c_vec, eps_block, A_eq = _lp_structure(n, m)
+
+    # Неравенства одним блоком:
+    #   [ A, -I] [x; eps] <=  y
+    #   [-A, -I] [x; eps] <= -y
+    A_sp = sp.csr_matrix(A)
+    A_ub = sp.hstack([sp.vstack([A_sp, -A_sp]), eps_block], format="csr")
+    b_ub = np.concatenate([y, -y])
+
+    # Границы: x_j >= L_j, eps_i >= 0
+    bounds = np.column_stack([
+        np.concatenate([L, np.zeros(n)]),
+        np.full(m + n, np.inf),
+    ])
+
+    return linprog(c=c_vec,
+                   A_ub=A_ub, b_ub=b_ub,
+                   A_eq=A_eq, b_eq=np.array([B]),
+                   bounds=bounds,
+                   method='highs')
+
+
 def distribute_budget_L1_lp(A, v, B, L=None):
     """
     Распределение бюджета L1‑методом (LP).
@@ -14,62 +62,14 @@ def distribute_budget_L1_lp(A, v, B, L=None):
     Возвращает:
       x_opt — оптимальный вектор бюджета длины m
       eps   — вектор ошибок длины n
-    """
-    n, m = A.shape
-    if L is None:
-        L = np.zeros(m)
-
-    # Целевая нагрузка по проблемам
-    y = (v / v.sum()) * B
 
-    # Переменные: сначала x[0..m-1], потом eps[m..m+n-1]
-    # Всего m + n переменных
-    # Целевая функция: min sum eps_i -> c = [0,...,0, 1,...,1]
-    c_vec = np.hstack([np.zeros(m), np.ones(n)])
-
-    # Ограничения равенства: sum_j x_j = B
-    A_eq = np.hstack([np.ones((1, m)), np.zeros((1, n))])
-    b_eq = np.array([B])
-
-    # Неравенства:
-    # Для каждой i:
-    #   A[i]·x - eps[i] <= y[i]
-    #  -A[i]·x - eps[i] <= -y[i]
-    A_ub = []
-    b_ub = []
-
-    # A[i]·x - eps[i] <= y[i]
-    for i in range(n):
-        row = np.hstack([ A[i], np.zeros(n) ])
-        row[m + i] = -1
-        A_ub.append(row)
-        b_ub.append(y[i])
-
-    # -A[i]·x - eps[i] <= -y[i]
-    for i in range(n):
-        row = np.hstack([ -A[i], np.zeros(n) ])
-        row[m + i] = -1
-        A_ub.append(row)
-        b_ub.append(-y[i])
-
-    A_ub = np.vstack(A_ub)
-    b_ub = np.array(b_ub)
-
-    # Границы для x и eps
-    bounds = []
-    # x_j >= L_j
-    for j in range(m):
-        bounds.append((L[j], None))
-    # eps_i >= 0
-    for i in range(n):
-        bounds.append((0, None))
+    Переменные: сначала x[0..m-1], потом eps[m..m+n-1]; ограничения
+    собираются разреженными блоками [[A, -I], [-A, -I]] без циклов по строкам.
+    """
+    m = A.shape[1]
 
     # Решаем LP
-    res = linprog(c=c_vec,
-                  A_ub=A_ub, b_ub=b_ub,
-                  A_eq=A_eq, b_eq=b_eq,
-                  bounds=bounds,
-                  method='highs')
+    res = _solve_L1_lp(A, v, B, L)
 
     if not res.success:
         raise RuntimeError("LP не решилась: " + res.message)
@@ -78,6 +78,32 @@ def distribute_budget_L1_lp(A, v, B, L=None):
     eps   = res.x[m:]
     return x_opt, eps
 
+
+def distribute_budget_L1_lp_batch(problems, B, L=None):
+    """
+    L1‑распределение для пачки отчетов.
+
+    Параметры:
+      problems — список пар (A, v) по отчетам
+      B        — общий бюджет
+      L        — нижние пороги (общие для всех отчетов) или None
+
+    Постоянные блоки LP берутся из кэша по размерности, поэтому для отчетов
+    одной формы собирается только блок с A.
+
+    Возвращает список (x_opt, eps) в порядке problems; None — если LP не решилась.
+    """
+    results = []
+    for A, v in problems:
+        res = _solve_L1_lp(A, v, B, L)
+        if res.success:
+            m = A.shape[1]
+            results.append((res.x[:m], res.x[m:]))
+        else:
+            results.append(None)
+    return results
+
+
 # --- Пример использования ---
 if __name__ == "__main__":
     # Данные
@@ -1,7 +1,39 @@
+from functools import lru_cache
+
 import cvxpy as cp
 import numpy as np
 
 
+@lru_cache(maxsize=32)
+def _compiled_biobj(n, m):
+    """
+    Параметризованная (DPP) задача distribute_budget_biobj для размерности (n, m).
+    A, y_B = y/B, lb = L/B и lambd_B = λ/B — cp.Parameter, поэтому канонизация
+    выполняется один раз, а последовательные решения по λ стартуют
+    с предыдущего решения. Цель поделена на B², чтобы OSQP не терял
+    точность на бюджетах порядка 10⁶; минимизатор от этого не меняется.
+    """
+    x = cp.Variable(m)
+    params = {
+        "A": cp.Parameter((n, m)),
+        "y_B": cp.Parameter(n),
+        "lb": cp.Parameter(m),
+        "lambd_B": cp.Parameter(nonneg=True),
+    }
+
+    cov_loss = cp.sum_squares(params["A"] @ x - params["y_B"])
+    use_loss = -cp.sum(x)
+
+    objective = cp.Minimize(cov_loss + params["lambd_B"] * use_loss)
+    constraints = [
+        cp.sum(x) <= 1,
+        x >= params["lb"],
+        x <= 1
+    ]
+
+    return cp.Problem(objective, constraints), x, params
+
+
 def distribute_budget_biobj(A, v, B, L=None, lambd=1.0):
     """
     Bi-objective via weighted sum:
@@ -16,19 +48,13 @@ def distribute_budget_biobj(A, v, B, L=None, lambd=1.0):
         L = np.zeros(m)
     lb = L / B
 
-    x = cp.Variable(m)
-    cov_loss = cp.sum_squares(B * (A @ x) - y)
-    use_loss = -B * cp.sum(x)
-
-    objective = cp.Minimize(cov_loss + lambd * use_loss)
-    constraints = [
-        cp.sum(x) <= 1,
-        x >= lb,
-        x <= 1
-    ]
+    prob, x, params = _compiled_biobj(n, m)
+    params["A"].value = A
+    params["y_B"].value = y / B
+    params["lb"].value = lb
+    params["lambd_B"].value = lambd / B
 
-    prob = cp.Problem(objective, constraints)
-    prob.solve(solver=cp.OSQP)
+    prob.solve(solver=cp.OSQP, warm_start=True, polish=True)
 
     x_opt = x.value
     z_opt = x_opt * B
@@ -41,6 +67,192 @@ def distribute_budget_biobj(A, v, B, L=None, lambd=1.0):
     return z_opt, rmse, used
 
 
+def _biobj_active_set(B, L, z, tol):
+    """Активный набор решения z: статьи на нижней и верхней границе, активен ли бюджет"""
+    low = z - L <= tol * B
+    up = (B - z <= tol * B) & ~low
+    budget = B - z.sum() <= tol * B
+    return low, up, budget
+
+
+def _biobj_piece(H, g, B, L, low, up, budget, lambd, tol):
+    """
+    Аффинный участок пути z(λ) = za + λ·zb при фиксированном активном наборе.
+
+    В абсолютных единицах задача имеет вид
+        min ||A z - y||^2 - λ sum(z),  sum(z) <= B,  L <= z <= B,
+    и при фиксированном активном наборе условия KKT линейны по λ.
+    Участок продолжается до первого λ, где свободная статья упирается
+    в границу, множитель активной границы или бюджета обращается в ноль
+    либо бюджет становится активным.
+
+    Возвращает (za, zb, lambd_end, hit) либо None, если система KKT
+    несовместна; hit — маска ограничения, сработавшего в lambd_end
+    (в порядке: свободные на L, свободные на B, множители нижних границ,
+    множители верхних границ, бюджет). Если активный набор неверен уже
+    в точке lambd, возвращается lambd_end = lambd и нарушенное
+    ограничение — его исправляет тот же _biobj_next_set.
+    """
+    m = len(g)
+    free = ~(low | up)
+    F = np.flatnonzero(free)
+    k = len(F)
+    z_fixed = np.where(low, L, np.where(up, B, 0.0))
+
+    # H_FF z_F + ν/2 = g_F - H_FW z_W + λ/2,  sum(z_F) = B - sum(z_W)
+    size = k + int(budget)
+    M = np.zeros((size, size))
+    M[:k, :k] = H[np.ix_(F, F)]
+    rhs = np.zeros((size, 2))
+    rhs[:k, 0] = g[F] - H[F] @ z_fixed
+    rhs[:k, 1] = 0.5
+    if budget:
+        M[:k, k] = 0.5
+        M[k, :k] = 1.0
+        rhs[k, 0] = B - z_fixed.sum()
+
+    sol = np.linalg.lstsq(M, rhs, rcond=None)[0] if size else np.zeros((0, 2))
+    residual = np.abs(M @ sol - rhs).max(axis=0) if size else np.zeros(2)
+    if np.any(residual > tol * np.maximum(np.abs(rhs).max(axis=0, initial=0.0), 1.0)):
+        return None
+
+    za, zb = z_fixed.copy(), np.zeros(m)
+    za[F], zb[F] = sol[:k, 0], sol[:k, 1]
+    nu_a, nu_b = (sol[k, 0], sol[k, 1]) if budget else (0.0, 0.0)
+
+    # градиент лагранжиана без множителей границ: 2Hz - 2g - λ + ν
+    grad_a = 2 * (H @ za - g) + nu_a
+    grad_b = 2 * (H @ zb) - 1 + nu_b
+
+    # ограничения участка в виде p + λ q >= 0
+    if budget:
+        p_budget, q_budget = nu_a, nu_b
+    else:
+        p_budget, q_budget = B - za.sum(), -zb.sum()
+    p = np.concatenate([za[F] - L[F], B - za[F], grad_a[low], -grad_a[up], [p_budget]])
+    q = np.concatenate([zb[F], -zb[F], grad_b[low], -grad_b[up], [q_budget]])
+
+    hit = np.zeros(len(p), bool)
+
+    # участок должен быть допустим уже в начальной точке
+    slack = p + lambd * q
+    violated = slack < -tol * np.maximum(np.abs(p), B)
+    if violated.any():
+        hit[-1 if violated[-1] else np.argmin(np.where(violated, slack, np.inf))] = True
+        return za, zb, lambd, hit
+
+    decreasing = q < -tol * (1 + np.abs(p))
+    if not decreasing.any():
+        return za, zb, np.inf, hit
+
+    crossing = np.full(len(p), np.inf)
+    crossing[decreasing] = -p[decreasing] / q[decreasing]
+    lambd_end = max(lambd, crossing.min())
+
+    # при одновременном срабатывании меняем по одному ограничению, бюджет — первым
+    if crossing[-1] <= lambd_end + tol * (1 + abs(lambd_end)):
+        hit[-1] = True
+    else:
+        hit[np.argmin(crossing)] = True
+    return za, zb, lambd_end, hit
+
+
+def _biobj_next_set(low, up, budget, hit):
+    """Активный набор следующего участка по сработавшим ограничениям"""
+    low, up = low.copy(), up.copy()
+    F = np.flatnonzero(~(low | up))
+    W_low, W_up = np.flatnonzero(low), np.flatnonzero(up)
+
+    to_low, to_up, from_low, from_up = np.split(hit[:-1], np.cumsum([len(F), len(F), len(W_low)]))
+    low[F[to_low]] = True
+    up[F[to_up & ~to_low]] = True
+    low[W_low[from_low]] = False
+    up[W_up[from_up]] = False
+    if hit[-1]:
+        budget = not budget
+    return low, up, budget
+
+
+def biobj_lambda_path(A, v, B, L=None, lambd_min=0.0, lambd_max=np.inf, tol=1e-6, max_pieces=None):
+    """
+    Вся кривая λ → распределение для distribute_budget_biobj.
+
+    Оптимум кусочно-линеен по λ, поэтому OSQP решает задачу один раз
+    в lambd_min (чтобы найти активный набор), а дальше путь проходится
+    параметрическим методом активного набора: каждый участок и излом
+    в его конце находятся точно из линейных по λ условий KKT, после чего
+    активный набор обновляется по сработавшему ограничению. Если участок
+    оказался вырожденным, активный набор заново берется из решения OSQP
+    с теплым стартом.
+
+    Возвращает dict:
+      lambdas — изломы пути (первый — lambd_min, последний — lambd_max или
+                λ, после которого распределение не меняется);
+      z       — распределения в этих точках (между ними — линейная интерполяция,
+                см. biobj_path_allocation);
+      used    — использованный бюджет в этих точках;
+      rmse    — RMSE покрытия в этих точках.
+    """
+    n, m = A.shape
+    y = (v / v.sum()) * B
+    if L is None:
+        L = np.zeros(m)
+    if max_pieces is None:
+        max_pieces = 4 * m + 10
+
+    # малая ридж-добавка делает путь единственным при вырожденной A^T A
+    # (n < m или статьи без покрытия), не меняя решение в пределах tol
+    H = A.T @ A
+    H += 1e-9 * max(np.trace(H) / m, 1.0) * np.eye(m)
+    g = A.T @ y
+
+    lambdas, zs = [], []
+    lambd = lambd_min
+    state = None
+    for _ in range(max_pieces):
+        piece = None
+        if state is not None:
+            piece = _biobj_piece(H, g, B, L, *state, lambd, tol)
+        if piece is None:
+            z, _, _ = distribute_budget_biobj(A, v, B, L=L, lambd=lambd)
+            state = _biobj_active_set(B, L, z, tol)
+            piece = _biobj_piece(H, g, B, L, *state, lambd, tol)
+        if piece is None and not state[2]:
+            # при λ > 0 статьи без покрытия доводят расход до бюджета
+            state = (state[0], state[1], True)
+            piece = _biobj_piece(H, g, B, L, *state, lambd, tol)
+        if piece is None:
+            raise RuntimeError(f"Не удалось построить участок пути при λ={lambd}")
+
+        za, zb, lambd_end, hit = piece
+        if lambd_end > lambd:
+            lambdas.append(lambd)
+            zs.append(za + lambd * zb)
+
+        if lambd_end >= lambd_max:
+            if np.isfinite(lambd_max):
+                lambdas.append(lambd_max)
+                zs.append(za + lambd_max * zb)
+            break
+
+        state = _biobj_next_set(*state, hit)
+        lambd = lambd_end
+
+    z = np.array(zs)
+    e = z @ A.T - y
+    return {
+        "lambdas": np.array(lambdas),
+        "z": z,
+        "used": z.sum(axis=1),
+        "rmse": np.sqrt(np.mean(e ** 2, axis=1)),
+    }
+
+
+def biobj_path_allocation(path, lambd):
+    """Распределение для произвольного λ по результату biobj_lambda_path"""
+    return np.array([np.interp(lambd, path["lambdas"], col) for col in path["z"].T])
+
+
 # --- Пример использования ---
 if __name__ == "__main__":
     A = np.array([
@@ -57,3 +269,8 @@ if __name__ == "__main__":
         z, rmse, used = distribute_budget_biobj(A, v, B, L=L, lambd=lambd)
         print(f"λ={lambd}: RMSE={rmse:.1f}, Used={used:.1f}")
         print(" z =", np.round(z, 1))
+
+    path = biobj_lambda_path(A, v, B, L=L)
+    print("\nИзломы пути по λ:")
+    for lambd, z, used in zip(path["lambdas"], path["z"], path["used"]):
+        print(f"λ={lambd:.3f}: Used={used:.1f}, z =", np.round(z, 1))
@@ -1,7 +1,45 @@
 import numpy as np
 import cvxpy as cp
 
-def distribute_budget_lexico(A, v, B, L=None, epsilon=1e-3):
+from main2 import distribute_budget_biobj
+
+
+def _lexico_penalized(A, v, B, L, epsilon, tol=1e-6):
+    """
+    Лексикографическая задача в виде двух решений одной кэшированной QP
+    из main2.distribute_budget_biobj:
+      1) λ = 0 — минимизация невязки покрытия;
+      2) λ = δ — невязка минус δ·sum(z), теплый старт от z1.
+
+    Для штрафной задачи f(z2) - δ·sum(z2) <= f(z1) - δ·sum(z1), откуда
+      f(z2) - f(z1) <= δ·(sum(z2) - sum(z1)) <= δ·(B - used1),
+    поэтому любое δ <= epsilon / (B - used1) гарантирует
+    cov2 <= cov1 + epsilon без квадратичного ограничения и конического
+    солвера. δ дополнительно ограничено (cov1 + epsilon) / B, чтобы штраф
+    не перевешивал невязку и OSQP не терял точность.
+
+    Если первый этап уже израсходовал бюджет (с точностью tol·B), второй
+    не нужен. Если решение второго этапа все же нарушает гарантию
+    (неточность OSQP), возвращается z1.
+    """
+    y = (v / v.sum()) * B
+
+    z1, _, used1 = distribute_budget_biobj(A, v, B, L=L, lambd=0.0)
+    cov1 = np.sum((A @ z1 - y) ** 2)
+
+    if B - used1 <= tol * B:
+        return z1, cov1, used1, z1.copy(), cov1, used1
+
+    delta = min(epsilon / (B - used1), (cov1 + epsilon) / B)
+    z2, _, used2 = distribute_budget_biobj(A, v, B, L=L, lambd=delta)
+    cov2 = np.sum((A @ z2 - y) ** 2)
+
+    if not cov2 <= cov1 + epsilon:
+        return z1, cov1, used1, z1.copy(), cov1, used1
+    return z1, cov1, used1, z2, cov2, used2
+
+
+def distribute_budget_lexico(A, v, B, L=None, epsilon=1e-3, mode="penalty"):
     """
     Распределение бюджета в два этапа:
       1) Минимизируем L2‑невязку покрытия проблем.
@@ -13,6 +51,11 @@ def distribute_budget_lexico(A, v, B, L=None, epsilon=1e-3):
       B       float         — общий бюджет
       L       np.array[m]   — нижние пороги затрат по статьям (абсолютные), по умолчанию None→0
       epsilon float         — допустимое ухудшение первой задачи (в единицах квадратичной ошибки)
+      mode    str           — "penalty": оба этапа — одна кэшированная QP (см. _lexico_penalized),
+                              второй этап со штрафом за неиспользованный бюджет и гарантией
+                              cov2 <= cov1 + epsilon;
+                              "two_stage": второй этап с квадратичным ограничением (CLARABEL),
+                              при неудаче — решение режима "penalty"
 
     Возвращает:
       z1      np.array[m] — распределение после первого этапа (использование ≤ B)
@@ -24,65 +67,72 @@ def distribute_budget_lexico(A, v, B, L=None, epsilon=1e-3):
         used2   — сумма z2
     """
     n, m = A.shape
-    # Целевые абсолютные расходы по проблемам
-    y = (v / v.sum()) * B
-
     # Нижние пороги на доли бюджета x_j = z_j / B
     if L is None:
         L = np.zeros(m)
-    lb = L / B  # теперь ограничения x_j ≥ lb
 
-    # Переменные для обоих этапов — доли бюджета
-    x = cp.Variable(m)
+    if mode == "penalty":
+        z1, cov1, used1, z2, cov2, used2 = _lexico_penalized(A, v, B, L, epsilon)
+    elif mode == "two_stage":
+        z1, cov1, used1, z2, cov2, used2 = _lexico_two_stage(A, v, B, L, epsilon)
+    else:
+        raise ValueError(f"Неизвестный режим: {mode}")
 
-    # Функция невязки покрытия (в абсолютных единицах)
-    z = x * B
-    cov_loss = cp.sum_squares(A @ z - y)  # = ||A·(xB) - y||²
+    metrics = {
+        'cov1':  cov1,
+        'used1': used1,
+        'cov2':  cov2,
+        'used2': used2
+    }
+    return z1, z2, metrics
 
-    # Общие ограничения
-    cons = [
-        cp.sum(x) <= 1,
-        x >= lb,
-        x <= 1
-    ]
 
-    # --- Этап 1: минимизация невязки покрытия ---
-    prob1 = cp.Problem(cp.Minimize(cov_loss), cons)
-    prob1.solve(solver=cp.OSQP)
+def _lexico_two_stage(A, v, B, L, epsilon, tol=1e-6):
+    """
+    Двухэтапная постановка с квадратичным ограничением на втором этапе.
+
+    Первый этап — та же кэшированная QP в долях бюджета с целью / B²,
+    что и в режиме "penalty" (main2._compiled_biobj, OSQP с теплым
+    стартом). Второй этап решается CLARABEL в тех же долях:
+      max sum(x)  при  ||A x - y/B||^2 <= (cov1 + epsilon) / B²,
+    так что ограничение не теряет точность на больших бюджетах.
+    Если CLARABEL не решил задачу (статус или SolverError) или решение
+    нарушает cov2 <= cov1 + epsilon, берется решение режима "penalty".
+    """
+    n, m = A.shape
+    # Целевые абсолютные расходы по проблемам
+    y = (v / v.sum()) * B
 
-    if prob1.status != cp.OPTIMAL:
-        raise RuntimeError(f"Первый этап не решил задачу: {prob1.status}")
+    # --- Этап 1: минимизация невязки покрытия ---
+    z1, _, used1 = distribute_budget_biobj(A, v, B, L=L, lambd=0.0)
+    cov1 = np.sum((A @ z1 - y) ** 2)
 
-    cov1  = cov_loss.value
-    z1    = x.value * B
-    used1 = z1.sum()
+    if B - used1 <= tol * B:
+        return z1, cov1, used1, z1.copy(), cov1, used1
 
     # --- Этап 2: максимизация использования бюджета при допуске по невязке ---
-    # Ограничение: cov_loss ≤ cov1 + epsilon
-    cons2 = cons + [
-        cov_loss <= cov1 + epsilon
+    x = cp.Variable(m)
+    cons = [
+        cp.sum(x) <= 1,
+        x >= L / B,
+        x <= 1,
+        cp.sum_squares(A @ x - y / B) <= (cov1 + epsilon) / B ** 2
     ]
-    # Цель: максимизировать sum(z) = B * sum(x) => эквивалентно max sum(x)
-    prob2 = cp.Problem(cp.Maximize(cp.sum(x)), cons2)
-    prob2.solve()
-
-    if prob2.status != cp.OPTIMAL:
-        # raise RuntimeError(f"Второй этап не решил задачу: {prob2.status}")
-        cov2 = None
-        used2 = None
-        z2 = None
-    else:
-        cov2 = cov_loss.value
+    prob2 = cp.Problem(cp.Maximize(cp.sum(x)), cons)
+    try:
+        prob2.solve(solver=cp.CLARABEL)
+    except cp.SolverError:
+        pass
+
+    if prob2.status == cp.OPTIMAL:
         z2 = x.value * B
-        used2 = z2.sum()
+        cov2 = np.sum((A @ z2 - y) ** 2)
+        if cov2 <= cov1 + epsilon:
+            return z1, cov1, used1, z2, cov2, z2.sum()
 
-    metrics = {
-        'cov1':  cov1,
-        'used1': used1,
-        'cov2':  cov2,
-        'used2': used2
-    }
-    return z1, z2, metrics
+    # второй этап не решился — берем штрафную постановку с той же гарантией
+    _, _, _, z2, cov2, used2 = _lexico_penalized(A, v, B, L, epsilon, tol)
+    return z1, cov1, used1, z2, cov2, used2
 
 
 # --- Пример использования ---
@@ -1,3 +1,6 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
 import numpy as np
 import pandas as pd
 from scipy.optimize import minimize
@@ -5,58 +8,177 @@ from scipy.optimize import minimize
 pd.set_option('display.max_columns', None)
 pd.set_option('display.max_rows', None)
 
-# Sample data (you can replace with your own)
-A = np.array([
-    [1.0, 0.5, 0.0],
-    [0.0, 1.0, 0.0],
-    [0.0, 0.5, 1.0],
-    [1.0, 0.1, 0.2]
-])
-v = np.array([550, 145, 200, 300])
-B = 1000.0
-L = np.array([100, 200, 200])
-w = np.array([0.4, 0.3, 0.3])
 
-# Derived targets
-y = (v / v.sum()) * B
+def _objectives(x, A, y, wB):
+    f1 = np.sum((A @ x - y) ** 2)   # coverage error (L2)
+    f2 = np.sum((x - wB) ** 2)      # deviation from priority
+    return f1, f2
+
+
+def _scalarized(x, alpha, A, y, wB):
+    """Scalarized objective alpha * f1 + (1 - alpha) * f2 with its gradient"""
+    r = A @ x - y
+    d = x - wB
+    value = alpha * (r @ r) + (1 - alpha) * (d @ d)
+    grad = 2 * alpha * (A.T @ r) + 2 * (1 - alpha) * d
+    return value, grad
+
 
+def _share_objective(u, alpha, scale, A, y, wB):
+    """_scalarized in budget shares u = x / scale, rescaled to O(1)"""
+    value, grad = _scalarized(u * scale, alpha, A, y, wB)
+    return value / scale ** 2, grad / scale
 
-def pareto_front(A, y, B, L, w, num_points=10):
+
+def _sweep(task):
+    """
+    Solves the scalarizations for a run of neighbouring alphas.
+    Each one is warm-started from its own start point if given,
+    otherwise from the previous solution of the run; if that fails,
+    it is retried once from the uniform split B / m.
+
+    SLSQP works in budget shares u = x / B: in x the objectives grow
+    like B^2 and its line search often stalls.
+    """
+    A, y, B, L, wB, alphas, starts = task
     m = A.shape[1]
-    results = []
+    scale = B if B > 0 else 1.0
+
+    cons = {'type': 'eq', 'fun': lambda u: np.sum(u) - B / scale, 'jac': lambda u: np.ones(m)}
+    bounds = [(L[j] / scale, None) for j in range(m)]
+
+    def solve(alpha, x_start):
+        res = minimize(_share_objective, x_start / scale, args=(alpha, scale, A, y, wB), jac=True,
+                       bounds=bounds, constraints=cons, method='SLSQP')
+        return res.success, res.x * scale
+
+    points = []
+    x_prev = starts[0]
+    for alpha, x_start in zip(alphas, starts):
+        if x_start is None:
+            x_start = x_prev
+        success, x = solve(alpha, x_start)
+        if not success:
+            success, x = solve(alpha, np.full(m, B / m))
+        if success:
+            x_prev = x
+            points.append((alpha, x))
+    return points
+
+
+def _bend_scores(f1, f2):
+    """
+    Refinement score of each segment between neighbouring front points:
+    normalized chord length times (1 + turning angle at its ends).
+    """
+    span1 = max(np.ptp(f1), 1e-12)
+    span2 = max(np.ptp(f2), 1e-12)
+    P = np.column_stack([f1 / span1, f2 / span2])
+
+    seg = np.diff(P, axis=0)
+    length = np.linalg.norm(seg, axis=1)
+
+    turn = np.zeros(len(P))
+    if len(seg) > 1:
+        u = seg[:-1] / np.maximum(length[:-1], 1e-12)[:, None]
+        v = seg[1:] / np.maximum(length[1:], 1e-12)[:, None]
+        turn[1:-1] = np.arccos(np.clip(np.sum(u * v, axis=1), -1.0, 1.0))
+
+    return length * (1 + (turn[:-1] + turn[1:]) / 2)
+
 
-    # Objective components
-    def f1(x):  # coverage error (L2)
-        return np.sum((A @ x - y) ** 2)
-
-    def f2(x):  # deviation from priority
-        return np.sum((x - w * B) ** 2)
-
-    # constraints and bounds
-    cons = {'type': 'eq', 'fun': lambda x: np.sum(x) - B}
-    bounds = [(L[j], None) for j in range(m)]
-
-    for alpha in np.linspace(0, 1, num_points):
-        # Scalarized objective
-        def obj(x):
-            return alpha * f1(x) + (1 - alpha) * f2(x)
-
-        x0 = np.full(m, B / m)
-        res = minimize(obj, x0, bounds=bounds, constraints=cons, method='SLSQP')
-        if res.success:
-            x_opt = res.x
-            results.append({
-                'alpha': alpha,
-                'f1_coverage_error': f1(x_opt),
-                'f2_priority_dev': f2(x_opt),
-                'x_values': x_opt
-            })
+def _solve_alphas(A, y, B, L, wB, alphas, starts, x0, max_workers):
+    """
+    Splits alphas into contiguous runs and sweeps them on a worker pool.
+    starts[i] is the warm start of alphas[i] (None - previous solution).
+    """
+    if max_workers == 1 or len(alphas) <= 1:
+        return _sweep((A, y, B, L, wB, alphas, starts))
+
+    runs = max(1, min(max_workers or os.cpu_count() or 1, len(alphas)))
+    bounds = np.linspace(0, len(alphas), runs + 1).astype(int)
+    tasks = []
+    for lo, hi in zip(bounds[:-1], bounds[1:]):
+        if hi > lo:
+            run_starts = [x0 if starts[lo] is None else starts[lo]] + list(starts[lo + 1:hi])
+            tasks.append((A, y, B, L, wB, alphas[lo:hi], run_starts))
+
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        return [point for run in pool.map(_sweep, tasks) for point in run]
+
+
+def pareto_front(A, y, B, L, w, num_points=10, max_workers=1, adaptive=False):
+    """
+    Pareto front of (coverage error, deviation from priority) via weighted sums.
+
+    Neighbouring alphas are warm-started from each other's solutions, and
+    contiguous runs of alphas are solved in parallel on max_workers processes
+    (None - one per core, 1 - no pool).
+
+    adaptive=True starts from a coarse uniform grid and then repeatedly
+    bisects the top half of the alpha intervals by bend score, until
+    num_points scalarizations have been solved.
+    """
+    m = A.shape[1]
+    wB = w * B
+    x0 = np.full(m, B / m)
+
+    if adaptive:
+        alphas = np.linspace(0, 1, min(num_points, max(3, num_points // 4)))
+    else:
+        alphas = np.linspace(0, 1, num_points)
+
+    starts = [x0] + [None] * (len(alphas) - 1)
+    points = dict(_solve_alphas(A, y, B, L, wB, alphas, starts, x0, max_workers))
+    evaluated = len(alphas)
+
+    while adaptive and evaluated < num_points and len(points) > 2:
+        keys = np.array(sorted(points))
+        f = np.array([_objectives(points[a], A, y, wB) for a in keys])
+        scores = _bend_scores(f[:, 0], f[:, 1])
+
+        # only the sharper half of the segments is refined per round,
+        # otherwise every segment gets bisected and the grid stays uniform
+        budget = min(num_points - evaluated, max(1, len(scores) // 2))
+        worst = np.sort(np.argsort(scores)[::-1][:budget])
+        new_alphas = (keys[worst] + keys[worst + 1]) / 2
+        starts = [points[a] for a in keys[worst]]
+
+        points.update(_solve_alphas(A, y, B, L, wB, new_alphas, starts, x0, max_workers))
+        evaluated += len(new_alphas)
+
+    results = []
+    for alpha in sorted(points):
+        x_opt = points[alpha]
+        f1, f2 = _objectives(x_opt, A, y, wB)
+        results.append({
+            'alpha': alpha,
+            'f1_coverage_error': f1,
+            'f2_priority_dev': f2,
+            'x_values': x_opt
+        })
 
     return pd.DataFrame(results)
 
 
-# Compute Pareto front
-df_pareto = pareto_front(A, y, B, L, w, num_points=10)
+if __name__ == "__main__":
+    # Sample data (you can replace with your own)
+    A = np.array([
+        [1.0, 0.5, 0.0],
+        [0.0, 1.0, 0.0],
+        [0.0, 0.5, 1.0],
+        [1.0, 0.1, 0.2]
+    ])
+    v = np.array([550, 145, 200, 300])
+    B = 1000.0
+    L = np.array([100, 200, 200])
+    w = np.array([0.4, 0.3, 0.3])
+
+    # Derived targets
+    y = (v / v.sum()) * B
+
+    # Compute Pareto front
+    df_pareto = pareto_front(A, y, B, L, w, num_points=10)
 
-# Display results
-print(df_pareto)
+    # Display results
+    print(df_pareto)
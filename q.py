@@ -1,6 +1,36 @@
+from functools import lru_cache
+
 import numpy as np
 import cvxpy as cp
 
+
+@lru_cache(maxsize=32)
+def _compiled_qp(n, m):
+    """
+    Параметризованная задача distribute_budget_qp для размерности (n, m).
+    A, y, B, L — cp.Parameter, канонизация выполняется один раз.
+    """
+    x = cp.Variable(m)
+    params = {
+        "A": cp.Parameter((n, m)),
+        "y": cp.Parameter(n),
+        "B": cp.Parameter(),
+        "L": cp.Parameter(m),
+    }
+
+    # Функция невязки по проблемам
+    residuals = params["A"] @ x - params["y"]
+    loss = cp.sum_squares(residuals)
+
+    constraints = [
+        cp.sum(x) == params["B"],
+        x >= params["L"],
+        x >= 0
+    ]
+
+    return cp.Problem(cp.Minimize(loss), constraints), x, params
+
+
 def distribute_budget_qp(c, A, B, L=None):
     """
     Решает задачу:
@@ -26,26 +56,18 @@ def distribute_budget_qp(c, A, B, L=None):
     # 2) Целевая «идеальная» нагрузка на проблемы
     y = (c / c.sum()) * B
 
-    # 3) Переменная
-    x = cp.Variable(m)
-
-    # 4) Функция невязки по проблемам
-    residuals = A @ x - y
-    loss = cp.sum_squares(residuals)
-
-    # 5) Ограничения
-    constraints = [
-        cp.sum(x) == B,
-        x >= L,
-        x >= 0
-    ]
+    # 3) Задача из кэша: канонизация один раз на размерность
+    prob, x, params = _compiled_qp(n, m)
+    params["A"].value = A
+    params["y"].value = y
+    params["B"].value = B
+    params["L"].value = L
 
-    # 6) Решаем QP
-    prob = cp.Problem(cp.Minimize(loss), constraints)
-    prob.solve(solver=cp.OSQP)
+    # 4) Решаем QP, стартуя с предыдущего решения
+    prob.solve(solver=cp.OSQP, warm_start=True)
 
-    x_opt = x.value
-    # 7) Считаем метрики качества покрытия проблем
+    x_opt = x.value.copy()
+    # 5) Считаем метрики качества покрытия проблем
     e = A @ x_opt - y
     MAE    = np.mean(np.abs(e))
     RMSE   = np.sqrt(np.mean(e**2))
@@ -0,0 +1,156 @@
+"""
+Устойчивость распределения distribute_budget к шуму в частотах проблем.
+
+Частоты problem_item.frequency — зашумленные счетчики, поэтому для отчета
+разыгрываются тысячи возмущенных векторов c (Пуассон или Дирихле),
+все они решаются одной пачкой, и по каждой статье считаются квантили
+выделенного бюджета:
+
+    from robustness import allocation_quantiles
+    table = allocation_quantiles(c, B, L, A, n_samples=2000)
+    print(table[[0.05, 0.5, 0.95]])
+"""
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+from util import influence_arrays_from_data, load_report_data, solve_budget_qp
+
+
+def perturb_frequencies(c, n_samples, kind="poisson", prior=0.5, rng=None):
+    """
+    Возмущенные частоты проблем, массив (n_samples, n).
+
+    kind="poisson" — каждая частота заменяется на Poisson(c_i);
+    kind="dirichlet" — доли проблем берутся из Dirichlet(c + prior)
+    (апостериорное распределение долей мультиномиальных счетчиков)
+    и умножаются на sum(c).
+    """
+    rng = np.random.default_rng(rng)
+    c = np.asarray(c, dtype=float)
+    if kind == "poisson":
+        C = rng.poisson(c, size=(n_samples, len(c))).astype(float)
+        # выборка без единого упоминания не задает целевые расходы
+        empty = C.sum(axis=1) == 0
+        C[empty] = c
+        return C
+    if kind == "dirichlet":
+        return rng.dirichlet(c + prior, size=n_samples) * c.sum()
+    raise ValueError(f"Неизвестный тип возмущения: {kind}")
+
+
+def batch_budget_qp(A, Y, B, L, mu=0.0, tol=1e-9):
+    """
+    solve_budget_qp для многих целевых векторов Y (S×n) с одной матрицей A.
+
+    Сначала решается задача для среднего Y, и ее свободный набор F
+    принимается за общий. KKT-система
+        [H_FF 1; 1' 0] [z_F; λ] = [b_F; R]
+    раскладывается один раз и решается сразу для всех S правых частей.
+    Решение выборки точное, если z_F >= 0 и множители активных координат
+    (H z - b + λ)_W >= 0. Остальные выборки (обычно немногие) решаются
+    solve_budget_qp с теплым стартом из F.
+
+    Возвращает (X, n_fallback): X — распределения (S×m), строки NaN для
+    нерешенных выборок; n_fallback — число выборок, решенных отдельно.
+    None, если нижние пороги не помещаются в бюджет.
+    """
+    Y = np.atleast_2d(np.asarray(Y, dtype=float))
+    S, m = len(Y), A.shape[1]
+    lb = np.maximum(L, 0.0)
+    R = B - lb.sum()
+    if R < 0:
+        return None
+
+    nominal = solve_budget_qp(A, Y.mean(axis=0), B, L, mu, return_free=True)
+    if nominal is None:
+        return None
+    _, free = nominal
+    F, W = np.flatnonzero(free), np.flatnonzero(~free)
+
+    H = A.T @ A
+    if sp.issparse(H):
+        H = H.toarray()
+    H = H + mu * np.eye(m)
+    b = np.asarray(A.T @ Y.T) - (H @ lb)[:, None]  # m×S
+
+    k = len(F)
+    K = np.zeros((k + 1, k + 1))
+    K[:k, :k] = H[np.ix_(F, F)]
+    K[:k, k] = K[k, :k] = 1.0
+    rhs = np.vstack([b[F], np.full((1, S), R)])
+    # lstsq: при mu = 0 H_FF может быть вырожденной, как в _kkt_solve
+    sol = np.linalg.lstsq(K, rhs, rcond=None)[0]
+    zF, lam = sol[:k], sol[k]
+
+    scale = max(np.abs(b).max(), np.abs(H).max() * max(R, 1.0), 1.0)
+    ok = (zF >= -tol * max(R, 1.0)).all(axis=0)
+    if len(W):
+        mult = H[np.ix_(W, F)] @ zF - b[W] + lam
+        ok &= (mult >= -tol * scale).all(axis=0)
+
+    X = np.tile(lb, (S, 1))
+    X[:, F] += np.maximum(zF, 0.0).T
+
+    bad = np.flatnonzero(~ok)
+    for s in bad:
+        x = solve_budget_qp(A, Y[s], B, L, mu, free=free)
+        X[s] = np.nan if x is None else x
+    return X, len(bad)
+
+
+def allocation_quantiles(c, B, L, A, n_samples=1000, kind="poisson", q=(0.05, 0.25, 0.5, 0.75, 0.95),
+                         mu=0.0, item_ids=None, seed=None, return_samples=False):
+    """
+    Квантили распределения distribute_budget по статьям при шуме в частотах.
+
+    Параметры:
+    c, B, L, A, mu: как в distribute_budget
+    n_samples (int): число возмущенных выборок
+    kind (str): "poisson" или "dirichlet" (см. perturb_frequencies)
+    q: уровни квантилей
+    item_ids: индекс таблицы (id статей бюджета)
+    return_samples (bool): вернуть также матрицу распределений выборок
+
+    Возвращает:
+    pd.DataFrame: по строке на статью — nominal (решение для исходного c),
+    квантили q, mean, std; или (таблица, X), если return_samples=True.
+    None, если задача несовместна.
+    """
+    C = perturb_frequencies(c, n_samples, kind, rng=seed)
+    Y = C / C.sum(axis=1, keepdims=True) * B
+    # первая строка — исходные частоты
+    Y = np.vstack([c / c.sum() * B, Y])
+
+    solved = batch_budget_qp(A, Y, B, L, mu)
+    if solved is None:
+        return None
+    X, _ = solved
+    nominal, X = X[0], X[1:]
+
+    table = pd.DataFrame(np.nanquantile(X, q, axis=0).T, columns=list(q), index=item_ids)
+    table.insert(0, "nominal", nominal)
+    table["mean"] = np.nanmean(X, axis=0)
+    table["std"] = np.nanstd(X, axis=0)
+    return (table, X) if return_samples else table
+
+
+def report_robustness(B, report_ids=None, L=None, engine=None, **kwargs):
+    """
+    allocation_quantiles для отчетов из БД (всех или только report_ids).
+
+    L — нижние пороги (None — B / m / 5, как в stream_allocations),
+    kwargs передаются в allocation_quantiles.
+
+    Возвращает словарь {report_id: таблица квантилей с индексом id статей}.
+    """
+    budget_items, reports = load_report_data(report_ids, engine)
+    arrays = influence_arrays_from_data(budget_items, reports, sparse=True)
+
+    result = {}
+    for report_id, (A, item_ids, _) in arrays.items():
+        c = np.array([problem[2] for problem in reports[report_id]["problems"]], dtype=float)
+        m = A.shape[1]
+        L_report = np.full(m, B / m / 5) if L is None else L
+        result[report_id] = allocation_quantiles(c, B, L_report, A, item_ids=item_ids, **kwargs)
+    return result
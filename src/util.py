@@ -1,8 +1,19 @@
-import psycopg2
-from psycopg2 import sql
+import hashlib
+import heapq
+import io
+import pickle
+import sqlite3
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
 import numpy as np
 import pandas as pd
-from sqlalchemy import create_engine
+import scipy.sparse as sp
+from scipy.sparse.csgraph import connected_components
+from scipy.sparse.linalg import aslinearoperator
+from sqlalchemy import bindparam, create_engine, text
 import cvxpy as cp
 
 # Параметры подключения к БД
@@ -15,22 +26,51 @@ DB_CONFIG = {
 }
 
 
-def get_problem_data():
+
+@lru_cache(maxsize=None)
+def get_engine():
+    """
+    Единый пул соединений SQLAlchemy на весь процесс.
+    Все загрузчики ниже берут соединения из него, а не открывают новые.
+    """
+    return create_engine(
+        f"postgresql+psycopg2://{DB_CONFIG['user']}:{DB_CONFIG['password']}@"
+        f"{DB_CONFIG['host']}:{DB_CONFIG['port']}/{DB_CONFIG['database']}",
+        pool_size=5,
+        max_overflow=5,
+        pool_pre_ping=True,
+    )
+
+
+def _report_filter(column, report_ids):
+    """Условие WHERE по списку отчетов (пустая строка — все отчеты)"""
+    if report_ids is None:
+        return ""
+    return f"WHERE {column} IN :report_ids"
+
+
+def _report_params(query, report_ids):
+    """Привязывает список отчетов к запросу с условием из _report_filter"""
+    query = text(query)
+    if report_ids is None:
+        return query, {}
+    return query.bindparams(bindparam("report_ids", expanding=True)), {"report_ids": list(report_ids)}
+
+
+def get_problem_data(engine=None):
     """Извлекает данные о проблемах и возвращает вектор кортежей (name, frequency)"""
     try:
-        # Подключаемся к БД
-        conn = psycopg2.connect(**DB_CONFIG)
-        cursor = conn.cursor()
+        engine = engine or get_engine()
 
         # SQL-запрос для выборки данных
-        query = sql.SQL("""
-                        SELECT name, frequency
-                        FROM problem_item
-                        ORDER BY id
-                        """)
+        query = text("""
+                     SELECT name, frequency
+                     FROM problem_item
+                     ORDER BY id
+                     """)
 
-        cursor.execute(query)
-        rows = cursor.fetchall()
+        with engine.connect() as conn:
+            rows = conn.execute(query).fetchall()
 
         # Формируем вектор кортежей
         problem_vector = [(row[0], row[1]) for row in rows]
@@ -42,27 +82,26 @@ def get_problem_data():
         return []
 
 
-def get_problem_data_by_report():
+def get_problem_data_by_report(report_ids=None, engine=None):
     """
     Извлекает данные о проблемах, сгруппированные по отчетам.
     Возвращает словарь: {report_id: [(problem_name, frequency), ...]}
     """
     try:
-        # Подключаемся к БД
-        conn = psycopg2.connect(**DB_CONFIG)
-        cursor = conn.cursor()
+        engine = engine or get_engine()
 
         # SQL-запрос для выборки данных с группировкой по отчетам
-        query = sql.SQL("""
+        query, params = _report_params(f"""
                         SELECT p.report_id,
                                p.name,
                                p.frequency
                         FROM problem_item p
+                        {_report_filter("p.report_id", report_ids)}
                         ORDER BY p.report_id, p.id
-                        """)
+                        """, report_ids)
 
-        cursor.execute(query)
-        rows = cursor.fetchall()
+        with engine.connect() as conn:
+            rows = conn.execute(query, params).fetchall()
 
         # Группируем данные по report_id
         report_data = {}
@@ -87,22 +126,20 @@ def get_problem_data_as_list():
     return list(report_dict.items())
 
 
-def get_budget_items():
+def get_budget_items(engine=None):
     """Извлекает статьи бюджета и возвращает вектор кортежей (name, min_budget)"""
     try:
-        # Подключаемся к БД
-        conn = psycopg2.connect(**DB_CONFIG)
-        cursor = conn.cursor()
+        engine = engine or get_engine()
 
         # SQL-запрос для выборки данных
-        query = sql.SQL("""
-                        SELECT name, min_sum
-                        FROM item
-                        ORDER BY id
-                        """)
+        query = text("""
+                     SELECT name, min_sum
+                     FROM item
+                     ORDER BY id
+                     """)
 
-        cursor.execute(query)
-        rows = cursor.fetchall()
+        with engine.connect() as conn:
+            rows = conn.execute(query).fetchall()
 
         # Формируем вектор кортежей
         budget_vector = [(row[0], float(row[1])) for row in rows]
@@ -114,15 +151,66 @@ def get_budget_items():
         return []
 
 
-def get_influence_matrix():
+def load_report_data(report_ids=None, engine=None):
+    """
+    Загружает за одно соединение и три запроса всё, что нужно для расчета
+    по отчетам: статьи бюджета, проблемы и связи problem_budget_link
+    для всех отчетов (или только для report_ids).
+
+    Возвращает (budget_items, reports):
+      budget_items — [(item_id, name, min_sum), ...] в порядке id;
+      reports — {report_id: {"problems": [(problem_item_id, name, frequency), ...],
+                             "links": [(problem_item_id, budget_item_id, efficiency), ...]}}
+    """
+    engine = engine or get_engine()
+
+    items_query = text("""
+                       SELECT id, name, min_sum
+                       FROM item
+                       ORDER BY id
+                       """)
+
+    problems_query, params = _report_params(f"""
+                       SELECT p.report_id, p.id, p.name, p.frequency
+                       FROM problem_item p
+                       {_report_filter("p.report_id", report_ids)}
+                       ORDER BY p.report_id, p.id
+                       """, report_ids)
+
+    links_query, _ = _report_params(f"""
+                       SELECT pi.report_id,
+                              pbl.problem_item_id,
+                              pbl.budget_item_id,
+                              pbl.efficiency
+                       FROM problem_budget_link pbl
+                                JOIN problem_item pi ON pi.id = pbl.problem_item_id
+                       {_report_filter("pi.report_id", report_ids)}
+                       ORDER BY pi.report_id, pbl.budget_item_id, pbl.problem_item_id
+                       """, report_ids)
+
+    with engine.connect() as conn:
+        items = conn.execute(items_query).fetchall()
+        problems = conn.execute(problems_query, params).fetchall()
+        links = conn.execute(links_query, params).fetchall()
+
+    budget_items = [(item_id, name, float(min_sum)) for item_id, name, min_sum in items]
+
+    reports = {}
+    for report_id, problem_id, name, frequency in problems:
+        report = reports.setdefault(report_id, {"problems": [], "links": []})
+        report["problems"].append((problem_id, name, frequency))
+
+    for report_id, problem_id, item_id, efficiency in links:
+        report = reports.setdefault(report_id, {"problems": [], "links": []})
+        report["links"].append((problem_id, item_id, float(efficiency)))
+
+    return budget_items, reports
+
+
+def get_influence_matrix(engine=None):
     """Извлекает матрицу влияния: строки - статьи бюджета, столбцы - проблемы"""
     try:
-        conn = psycopg2.connect(**DB_CONFIG)
-
-        engine = create_engine(
-            f"postgresql+psycopg2://{DB_CONFIG['user']}:{DB_CONFIG['password']}@"
-            f"{DB_CONFIG['host']}:{DB_CONFIG['port']}/{DB_CONFIG['database']}"
-        )
+        engine = engine or get_engine()
 
         # Запрос для получения данных с именами
         query = """
@@ -136,7 +224,8 @@ def get_influence_matrix():
                         """
 
         # Читаем данные в DataFrame
-        df = pd.read_sql(query, engine)
+        with engine.connect() as conn:
+            df = pd.read_sql(text(query), conn)
 
         # Если данных нет, возвращаем пустые структуры
         if df.empty:
@@ -158,9 +247,6 @@ def get_influence_matrix():
     except Exception as e:
         print(f"Ошибка при получении матрицы влияния: {e}")
         return pd.DataFrame(), [], []
-    finally:
-        if conn:
-            conn.close()
 
 
 def get_influence_matrix_as_array():
@@ -173,31 +259,31 @@ def get_influence_matrix_as_array():
     return matrix_df.to_numpy(), budget_items, problem_items
 
 
-def get_influence_matrix_by_report():
+def get_influence_matrix_by_report(report_ids=None, engine=None):
     """
-    Извлекает матрицы влияния, сгруппированные по отчетам.
+    Извлекает матрицы влияния, сгруппированные по отчетам, одним запросом
+    (для всех отчетов или только для report_ids).
     Возвращает словарь: {report_id: (matrix_df, budget_items, problem_items)}
     """
     try:
-        engine = create_engine(
-            f"postgresql+psycopg2://{DB_CONFIG['user']}:{DB_CONFIG['password']}@"
-            f"{DB_CONFIG['host']}:{DB_CONFIG['port']}/{DB_CONFIG['database']}"
-        )
+        engine = engine or get_engine()
 
         # Запрос для получения данных с указанием отчета
-        query = """
-                SELECT pi.report_id, \
-                       bi.name AS budget_item, \
-                       pi.name AS problem_item, \
+        query, params = _report_params(f"""
+                SELECT pi.report_id,
+                       bi.name AS budget_item,
+                       pi.name AS problem_item,
                        pbl.efficiency
                 FROM problem_budget_link pbl
                          JOIN item bi ON bi.id = pbl.budget_item_id
                          JOIN problem_item pi ON pi.id = pbl.problem_item_id
-                ORDER BY pi.report_id, bi.id, pi.id \
-                """
+                {_report_filter("pi.report_id", report_ids)}
+                ORDER BY pi.report_id, bi.id, pi.id
+                """, report_ids)
 
         # Читаем все данные
-        df = pd.read_sql(query, engine)
+        with engine.connect() as conn:
+            df = pd.read_sql(query, conn, params=params)
 
         if df.empty:
             return {}
@@ -225,31 +311,32 @@ def get_influence_matrix_by_report():
         return {}
 
 
-def get_influence_matrix_for_report(report_id):
+def get_influence_matrix_for_report(report_id, engine=None):
     """
     Извлекает матрицу влияния для конкретного отчета
     Возвращает (matrix_df, budget_items, problem_items)
+
+    Для нескольких отчетов используйте get_influence_matrix_by_report(report_ids),
+    чтобы не делать по запросу на отчет.
     """
     try:
-        engine = create_engine(
-            f"postgresql+psycopg2://{DB_CONFIG['user']}:{DB_CONFIG['password']}@"
-            f"{DB_CONFIG['host']}:{DB_CONFIG['port']}/{DB_CONFIG['database']}"
-        )
+        engine = engine or get_engine()
 
         # Запрос для конкретного отчета
-        query = """
-                SELECT bi.name AS budget_item, \
-                       pi.name AS problem_item, \
+        query = text("""
+                SELECT bi.name AS budget_item,
+                       pi.name AS problem_item,
                        pbl.efficiency
                 FROM problem_budget_link pbl
                          JOIN item bi ON bi.id = pbl.budget_item_id
                          JOIN problem_item pi ON pi.id = pbl.problem_item_id
-                WHERE pi.report_id = %(report_id)s
-                ORDER BY bi.id, pi.id \
-                """
+                WHERE pi.report_id = :report_id
+                ORDER BY bi.id, pi.id
+                """)
 
         # Читаем данные
-        df = pd.read_sql(query, engine, params={"report_id": report_id})
+        with engine.connect() as conn:
+            df = pd.read_sql(query, conn, params={"report_id": report_id})
 
         if df.empty:
             return pd.DataFrame(), [], []
@@ -268,75 +355,994 @@ def get_influence_matrix_for_report(report_id):
         return pd.DataFrame(), [], []
 
 
-def distribute_budget(c, B, L, A, mu=0.0):
+def influence_arrays_from_data(budget_items, reports, sparse=False):
     """
-    Распределяет бюджетные средства на основе частоты упоминаний проблем и нижних пороговых ограничений.
+    Строит матрицы влияния по данным load_report_data без pandas:
+    id проблем и статей отображаются в индексы, а efficiency
+    раскладывается сразу в заранее выделенный массив float64.
+
+    Строки — проблемы отчета в порядке id (как в c), столбцы — все статьи
+    бюджета в порядке id, поэтому матрица уже имеет вид n×m для оптимизации
+    (транспонировать, как после pivot, не нужно).
+
+    sparse=True — scipy.sparse.csr_matrix вместо плотного массива.
+
+    Возвращает словарь: {report_id: (A, budget_item_ids, problem_item_ids)}
+    """
+    item_ids = np.array([item[0] for item in budget_items], dtype=np.int64)
+    m = len(item_ids)
+
+    result = {}
+    for report_id, report in reports.items():
+        problem_ids = np.array([problem[0] for problem in report["problems"]], dtype=np.int64)
+        n = len(problem_ids)
+
+        links = np.array(report["links"], dtype=np.float64).reshape(-1, 3)
+        rows = np.searchsorted(problem_ids, links[:, 0].astype(np.int64))
+        cols = np.searchsorted(item_ids, links[:, 1].astype(np.int64))
+
+        if sparse:
+            A = sp.csr_matrix((links[:, 2], (rows, cols)), shape=(n, m))
+            # связи с нулевой эффективностью не храним
+            A.eliminate_zeros()
+        else:
+            A = np.zeros((n, m))
+            A[rows, cols] = links[:, 2]
+
+        result[report_id] = (A, item_ids, problem_ids)
+
+    return result
+
+
+def get_influence_arrays(report_ids=None, sparse=False, engine=None):
+    """
+    Матрицы влияния n×m для всех отчетов (или только для report_ids)
+    в виде numpy / scipy.sparse — замена get_influence_matrix_by_report
+    с последующим .to_numpy().T.
+    Возвращает словарь: {report_id: (A, budget_item_ids, problem_item_ids)}
+    """
+    budget_items, reports = load_report_data(report_ids, engine)
+    return influence_arrays_from_data(budget_items, reports, sparse)
+
+
+def fetch_new_reports(watermark=None, limit=1000, engine=None):
+    """
+    Id отчетов problem_report после водяного знака watermark — id последнего
+    обработанного отчета (None — с самого начала) — в порядке id.
+
+    Водяной знак — serial id, а не created_at: created_at задает клиент
+    (bd/fill.sql вставляет отчеты «задним числом»), и отчет с ранней датой,
+    вставленный позже, по (created_at, id) был бы пропущен.
+
+    Возвращает список id длиной не больше limit.
+    """
+    engine = engine or get_engine()
+
+    query = text("""
+                 SELECT id
+                 FROM problem_report
+                 WHERE id > :id
+                 ORDER BY id
+                 LIMIT :limit
+                 """)
+    params = {"id": -1 if watermark is None else watermark, "limit": limit}
+
+    with engine.connect() as conn:
+        return [report_id for report_id, in conn.execute(query, params)]
+
+
+def stream_reports(watermark=None, batch_size=100, poll_interval=5.0, max_polls=None, sparse=False,
+                   settle_polls=12, engine=None):
+    """
+    Генератор новых отчетов: опрашивает problem_report по водяному знаку
+    (id последнего выданного отчета) и для каждого нового отчета выдает
+        (report_id, c, A, budget_item_ids, problem_item_ids, watermark),
+    где c — частоты проблем, A — матрица влияния n×m, watermark — знак,
+    с которого можно продолжить после перезапуска.
+
+    Отчет вставляется раньше своих проблем и связей (bd/fill.sql), поэтому
+    на отчете без problem_item или problem_budget_link генератор
+    останавливается и не сдвигает водяной знак, пока данные не появятся.
+    Отчет, оставшийся пустым settle_polls опросов подряд, пропускается,
+    чтобы он не держал поток вечно.
+
+    Данные догружаются только для новых отчетов (load_report_data
+    по их id), без перечитывания всей базы. Если готовых отчетов нет,
+    генератор ждет poll_interval секунд; max_polls — число опросов подряд
+    без готовых отчетов до остановки (None — бесконечно). Работает с любым
+    движком SQLAlchemy, в том числе с SQLite вместо Postgres.
+    """
+    engine = engine or get_engine()
+    idle = 0
+    waiting, waited = None, 0
+    while max_polls is None or idle < max_polls:
+        new = fetch_new_reports(watermark, batch_size, engine)
+        yielded, blocked = 0, False
+
+        if new:
+            budget_items, reports = load_report_data(new, engine)
+            arrays = influence_arrays_from_data(budget_items, reports, sparse)
+
+            for report_id in new:
+                report = reports.get(report_id)
+                if report is None or not report["problems"] or not report["links"]:
+                    # отчет еще дописывается
+                    waited = waited + 1 if report_id == waiting else 1
+                    waiting = report_id
+                    if waited <= settle_polls:
+                        blocked = True
+                        break
+                    # так и не заполнился — пропускаем
+                    watermark = report_id
+                    continue
+
+                A, item_ids, problem_ids = arrays[report_id]
+                c = np.array([problem[2] for problem in report["problems"]], dtype=float)
+                watermark = report_id
+                yielded += 1
+                yield report_id, c, A, item_ids, problem_ids, watermark
+
+        idle = 0 if yielded else idle + 1
+        if (blocked or not yielded) and (max_polls is None or idle < max_polls):
+            time.sleep(poll_interval)
+
+
+def stream_allocations(B, method="distribute_budget", L=None, cache=None, **stream_kwargs):
+    """
+    Распределение бюджета B для каждого нового отчета из stream_reports.
+
+    L — нижние пороги (None — B / m / 5, как в ноутбуке), cache —
+    AllocationCache, чтобы повторно пришедшие отчеты не решались заново.
+    stream_kwargs передаются в stream_reports (watermark, poll_interval, engine, ...).
+
+    Выдает (report_id, AllocationResult или None, watermark).
+    """
+    solve = cache.allocate if cache is not None else allocate
+    for report_id, c, A, _, _, watermark in stream_reports(**stream_kwargs):
+        m = A.shape[1]
+        L_report = np.full(m, B / m / 5) if L is None else L
+        A = A.toarray() if sp.issparse(A) else A
+        yield report_id, solve(method, c, B, L_report, A), watermark
+
+
+_UPSERT_FOUNDATION_REPORT = """
+    INSERT INTO foundation_report (problem_report_id, method)
+    VALUES {values}
+    ON CONFLICT (problem_report_id, method) DO UPDATE SET created_at = CURRENT_TIMESTAMP
+    RETURNING problem_report_id, id
+"""
+
+
+def _foundation_item_rows(allocations, foundation_ids):
+    """Строки foundation_item (sum, report_id, item_id) для всех распределений"""
+    for report_id, (x, item_ids) in allocations.items():
+        foundation_id = foundation_ids[report_id]
+        for total, item_id in zip(np.asarray(x, dtype=float).tolist(), np.asarray(item_ids).tolist()):
+            yield total, foundation_id, item_id
+
+
+def _save_allocations_copy(allocations, method, engine):
+    """Запись в Postgres: execute_values для отчетов и COPY FROM STDIN для статей"""
+    from psycopg2.extras import execute_values
+
+    conn = engine.raw_connection()
+    try:
+        with conn.cursor() as cur:
+            rows = execute_values(cur, _UPSERT_FOUNDATION_REPORT.format(values="%s"),
+                                  [(report_id, method) for report_id in allocations], fetch=True)
+            foundation_ids = dict(rows)
+
+            cur.execute("DELETE FROM foundation_item WHERE report_id = ANY(%s)",
+                        (list(foundation_ids.values()),))
+
+            buf = io.StringIO()
+            buf.writelines(f"{total!r}\t{report_id}\t{item_id}\n"
+                           for total, report_id, item_id in _foundation_item_rows(allocations, foundation_ids))
+            buf.seek(0)
+            cur.copy_expert("COPY foundation_item (sum, report_id, item_id) FROM STDIN", buf)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+    return foundation_ids
+
+
+def _save_allocations_generic(allocations, method, engine):
+    """Запись через SQLAlchemy для остальных СУБД (например, SQLite)"""
+    upsert = text(_UPSERT_FOUNDATION_REPORT.format(values="(:problem_report_id, :method)"))
+    delete = text("DELETE FROM foundation_item WHERE report_id IN :ids").bindparams(
+        bindparam("ids", expanding=True))
+    insert = text("INSERT INTO foundation_item (sum, report_id, item_id) VALUES (:sum, :report_id, :item_id)")
+
+    with engine.begin() as conn:
+        foundation_ids = {}
+        for report_id in allocations:
+            row = conn.execute(upsert, {"problem_report_id": report_id, "method": method}).one()
+            foundation_ids[row[0]] = row[1]
+
+        conn.execute(delete, {"ids": list(foundation_ids.values())})
+        conn.execute(insert, [{"sum": total, "report_id": report_id, "item_id": item_id}
+                              for total, report_id, item_id in _foundation_item_rows(allocations, foundation_ids)])
+
+    return foundation_ids
+
+
+def save_allocations(allocations, method, engine=None):
+    """
+    Сохраняет распределения многих отчетов в foundation_report / foundation_item
+    одной транзакцией.
 
     Параметры:
-    n (int): число проблем
-    m (int): число статей расходов
-    w (np.array): веса статей
-    c (np.array): частоты упоминаний проблем
-    B (float): общий бюджет
-    L (np.array): нижние пороговые ограничения для статей расходов
-    a (np.array): матрица коэффициентов связи между проблемами и статьями расходов
+    allocations (dict): {problem_report_id: (x, budget_item_ids)}
+    method (str): имя метода распределения
+
+    Запись идемпотентна: для пары (problem_report_id, method) существует
+    одна строка foundation_report, при повторной записи ее статьи
+    заменяются целиком. В Postgres отчеты пишутся одним execute_values,
+    статьи — COPY FROM STDIN; для других СУБД — пакетным INSERT.
 
     Возвращает:
-    np.array: оптимальное распределение бюджета по статьям расходов
+    dict: {problem_report_id: foundation_report.id}
     """
-    n = len(c)
-    m = len(L)
+    if not allocations:
+        return {}
+
+    engine = engine or get_engine()
+    if engine.dialect.name == "postgresql":
+        return _save_allocations_copy(allocations, method, engine)
+    return _save_allocations_generic(allocations, method, engine)
 
+
+@lru_cache(maxsize=32)
+def _compiled_budget_problem(n, m, solver):
+    """
+    Параметризованная (DPP) задача distribute_budget для размерности (n, m).
+
+    Данные задачи (A, y, B, L, mu) — cp.Parameter, поэтому канонизация
+    cvxpy выполняется один раз на размерность и солвер, а повторные
+    решения лишь подставляют новые значения параметров. Кэш вытесняет
+    давно не использованные размерности (LRU).
+
+    Возвращает (problem, x, params), params — словарь параметров по именам.
+    """
     # Переменные для оптимизации
     x = cp.Variable(m, nonneg=True)
-    l = L / sum(L)
 
-    # y = c / c.sum()
-    y = c / c.sum() * B
+    params = {
+        "A": cp.Parameter((n, m)),
+        "y": cp.Parameter(n),
+        "B": cp.Parameter(),
+        "L": cp.Parameter(m),
+        "mu": cp.Parameter(nonneg=True),
+    }
 
     # Целевая функция
-    I = A @ x - y
-    # I = A @ x * B - y
+    I = params["A"] @ x - params["y"]
 
     loss = cp.sum_squares(I)
     reg_loss = cp.sum_squares(x)
 
-    # objective = cp.Minimize(loss)
-    objective = cp.Minimize(loss + mu * reg_loss)
+    objective = cp.Minimize(loss + params["mu"] * reg_loss)
 
     # Ограничения
     constraints = [
-        cp.sum(x) == B,
-        x >= L,
+        cp.sum(x) == params["B"],
+        x >= params["L"],
     ]
     # Задача оптимизации
     problem = cp.Problem(objective, constraints)
 
+    return problem, x, params
+
+
+def _kkt_solve_blocks(H, b, R, F, labels):
+    """
+    KKT-система для блочно-диагональной H (связные компоненты после
+    presolve_budget): каждый блок G решается отдельно, H_GG [u v] = [b_G 1],
+    а компоненты связывает только λ = (sum(u) - R) / sum(v), z = u - λ v.
+    Возвращает None, если какой-то блок вырожден, — тогда решается
+    общая система.
+    """
+    u = np.empty(len(F))
+    v = np.empty(len(F))
+    slack = []
+
+    order = np.argsort(labels, kind="stable")
+    for idx in np.split(order, np.flatnonzero(np.diff(labels[order])) + 1):
+        G = F[idx]
+        if len(G) == 1:
+            h = H[G[0], G[0]]
+            if h == 0:
+                # координата без влияния: ее строка KKT дает λ = b_i
+                slack.append(idx[0])
+                continue
+            if h < 0:
+                return None
+            u[idx], v[idx] = b[G] / h, 1.0 / h
+            continue
+
+        H_GG = H[np.ix_(G, G)]
+        rhs = np.column_stack([b[G], np.ones(len(G))])
+        try:
+            sol = np.linalg.solve(H_GG, rhs)
+        except np.linalg.LinAlgError:
+            return None
+        if not np.allclose(H_GG @ sol, rhs, rtol=1e-8, atol=1e-8 * np.abs(rhs).max()):
+            return None
+        u[idx], v[idx] = sol[:, 0], sol[:, 1]
+
+    if slack:
+        lam = b[F[slack[0]]]
+        if not np.allclose(b[F[slack]], lam):
+            return None
+        z = u - lam * v
+        # остаток бюджета делится поровну между координатами без влияния
+        rest = np.ones(len(F), bool)
+        rest[slack] = False
+        z[slack] = (R - z[rest].sum()) / len(slack)
+        return z, lam
+
+    if v.sum() <= 0:
+        return None
+    lam = (u.sum() - R) / v.sum()
+    return u - lam * v, lam
+
+
+def _kkt_solve(H, b, R, F, blocks=None):
+    """
+    KKT-система задачи на свободных координатах F: H_FF z + λ·1 = b_F, sum(z) = R.
+    blocks — номера компонент координат (см. presolve_budget) для
+    поблочного решения.
+    """
+    if blocks is not None:
+        solved = _kkt_solve_blocks(H, b, R, F, blocks[F])
+        if solved is not None:
+            return solved
+
+    k = len(F)
+
+    kkt = np.empty((k + 1, k + 1))
+    kkt[:k, :k] = H[np.ix_(F, F)]
+    kkt[:k, k] = 1.0
+    kkt[k, :k] = 1.0
+    kkt[k, k] = 0.0
+    rhs = np.append(b[F], R)
+
+    try:
+        sol = np.linalg.solve(kkt, rhs)
+    except np.linalg.LinAlgError:
+        # вырожденная H (нулевые столбцы A при mu = 0)
+        sol = np.linalg.lstsq(kkt, rhs, rcond=None)[0]
+    return sol[:k], sol[k]
+
+
+def _active_set_qp(H, b, R, free=None, max_iter=None, tol=1e-10, z0=None, blocks=None):
+    """
+    Прямой метод активного набора для задачи
+        min z'Hz - 2b'z   при   sum(z) = R,  z >= 0.
+
+    На каждом шаге решается KKT-система на свободных координатах F
+        H_FF z_F + λ·1 = b_F,   sum(z_F) = R,
+    после чего либо делается шаг до первой блокирующей границы (координата
+    уходит в активный набор), либо по множителям μ = (Hz - b + λ)_W
+    из активного набора освобождается координата с наиболее
+    отрицательным μ. H может быть вырожденной (нулевые столбцы A при mu = 0):
+    b ортогонален ядру H, поэтому lstsq дает корректный минимизатор.
+
+    free — начальный свободный набор (bool[m]) для теплого старта,
+    z0 — начальная точка на этом наборе (по умолчанию равномерная).
+    blocks — номера связных компонент для поблочных KKT-систем.
+
+    Возвращает (z, free) либо None, если итерации не сошлись.
+    """
+    m = len(b)
+    if free is None:
+        # начальный набор: координаты, положительные в решении без z >= 0
+        z = np.maximum(_kkt_solve(H, b, R, np.arange(m), blocks)[0], 0.0)
+        free = z > 0
+    else:
+        free = free.copy()
+        z = free.astype(float) if z0 is None else np.where(free, np.maximum(z0, 0.0), 0.0)
+    if not free.any() or not z.any():
+        free[np.argmax(b)] = True
+        z = free.astype(float)
+    if max_iter is None:
+        max_iter = 10 * m + 50
+
+    # допустимая начальная точка на симплексе
+    z *= R / z.sum()
+
+    scale = max(np.abs(b).max(), np.abs(H).max() * max(R, 1.0), 1.0)
+
+    for _ in range(max_iter):
+        F = np.flatnonzero(free)
+        cand, lam = _kkt_solve(H, b, R, F, blocks)
+
+        blocking = cand < -tol * max(R, 1.0)
+        if blocking.any():
+            # шаг до первой границы z_i = 0
+            zF = z[F]
+            ratios = zF[blocking] / (zF[blocking] - cand[blocking])
+            i = np.argmin(ratios)
+            z[F] = zF + ratios[i] * (cand - zF)
+            out = F[np.flatnonzero(blocking)[i]]
+            z[out] = 0.0
+            free[out] = False
+            continue
+
+        z[:] = 0.0
+        z[F] = np.maximum(cand, 0.0)
+
+        # множители Лагранжа активных ограничений z_i >= 0
+        W = np.flatnonzero(~free)
+        if len(W) == 0:
+            return z, free
+        mult = H[W] @ z - b[W] + lam
+        i = np.argmin(mult)
+        if mult[i] >= -tol * scale:
+            return z, free
+        free[W[i]] = True
+
+    return None
+
+
+def solve_budget_qp(A, y, B, L, mu=0.0, free=None, return_free=False, blocks=None):
+    """
+    Точное (до допуска) решение задачи distribute_budget без cvxpy:
+        min ||A x - y||^2 + mu ||x||^2   при   sum(x) = B,  x >= max(L, 0).
+
+    Замена x = lb + z сводит задачу к симплексу {z >= 0, sum(z) = B - sum(lb)},
+    которую решает _active_set_qp. Для задач размера отчета это доли
+    миллисекунды вместо канонизации cvxpy и без OPTIMAL_INACCURATE.
+
+    free — свободный набор предыдущего решения для теплого старта.
+    return_free=True — вернуть (x, free), чтобы передать набор дальше.
+    blocks — номера связных компонент статей (presolve_budget): KKT-системы
+    решаются по компонентам, связанным только бюджетом.
+
+    Возвращает x (или (x, free)); None, если задача несовместна
+    или метод не сошелся.
+    """
+    lb = np.maximum(L, 0.0)
+    R = B - lb.sum()
+    if R < 0:
+        return None
+
+    H = A.T @ A
+    if sp.issparse(H):
+        H = H.toarray()
+    H = H + mu * np.eye(A.shape[1])
+    b = A.T @ y - H @ lb
+
+    solved = _active_set_qp(H, b, R, free, blocks=blocks)
+    if solved is None:
+        return None
+
+    z, free = solved
+    x = lb + z
+    return (x, free) if return_free else x
+
+
+class IncrementalBudgetQP:
+    """
+    Задача distribute_budget, которая пересчитывается при изменении данных
+    одного отчета без решения с нуля.
+
+    Хранит H = A'A + mu·I, g = A'c и H·lb. Изменение частоты одной проблемы
+    меняет g на строку A, добавление или удаление проблемы — H на
+    ранг-один a·a' и g на c_i·a, так что обновление данных стоит O(m²).
+    Затем _active_set_qp стартует с прежнего свободного набора и прежней
+    точки: если активный набор не изменился, это одна KKT-система
+    размера |F| + 1.
+
+        qp = IncrementalBudgetQP(c, B, L, A)
+        x = qp.update_frequency(3, 120)
+    """
+
+    def __init__(self, c, B, L, A, mu=0.0):
+        self.A = np.array(A, dtype=float)
+        self.c = np.array(c, dtype=float)
+        self.B = B
+        self.lb = np.maximum(L, 0.0)
+        self.R = B - self.lb.sum()
+        if self.R < 0:
+            raise ValueError("Сумма нижних порогов превышает бюджет")
+
+        self._H = self.A.T @ self.A + mu * np.eye(self.A.shape[1])
+        self._g = self.A.T @ self.c
+        self._Hlb = self._H @ self.lb
+        self._free = None
+        self._z = None
+        self.x = None
+        self._solve()
+
+    @property
+    def y(self):
+        """Целевые расходы по проблемам"""
+        return self.c / self.c.sum() * self.B
+
+    def _solve(self):
+        b = self.B / self.c.sum() * self._g - self._Hlb
+        solved = _active_set_qp(self._H, b, self.R, self._free, z0=self._z)
+        if solved is None and self._free is not None:
+            # теплый старт не сошелся — решаем с нуля
+            solved = _active_set_qp(self._H, b, self.R)
+        if solved is None:
+            raise RuntimeError("Метод активного набора не сошелся")
+
+        self._z, self._free = solved
+        self.x = self.lb + self._z
+        return self.x
+
+    def update_frequency(self, i, frequency):
+        """Новая частота проблемы i; возвращает новое распределение"""
+        self._g += (frequency - self.c[i]) * self.A[i]
+        self.c[i] = frequency
+        return self._solve()
+
+    def add_problem(self, a, frequency):
+        """Новая проблема со строкой влияния a; возвращает новое распределение"""
+        a = np.asarray(a, dtype=float)
+        self._H += np.outer(a, a)
+        self._g += frequency * a
+        self._Hlb += a * (a @ self.lb)
+        self.A = np.vstack([self.A, a])
+        self.c = np.append(self.c, frequency)
+        return self._solve()
+
+    def remove_problem(self, i):
+        """Удаляет проблему i; возвращает новое распределение"""
+        a = self.A[i]
+        self._H -= np.outer(a, a)
+        self._g -= self.c[i] * a
+        self._Hlb -= a * (a @ self.lb)
+        self.A = np.delete(self.A, i, axis=0)
+        self.c = np.delete(self.c, i)
+        return self._solve()
+
+    def metrics(self):
+        """(mae, mse, rmse, r2) текущего распределения"""
+        return allocation_metrics(self.A, self.x, self.y)
+
+
+def presolve_budget(A, y, L, mu=0.0):
+    """
+    Упрощение задачи distribute_budget
+        min ||A x - y||^2 + mu ||x||^2   при   sum(x) = B,  x >= max(L, 0)
+    перед решением. Шаги опираются на эту квадратичную цель, поэтому
+    presolve относится только к ней: у DP, жадных и L1-методов статья
+    без влияния не бесплатна (сепарабельная стоимость (q·d)^2) или цель
+    иначе сворачивается, и они получают исходную задачу.
+
+    1. при mu = 0 статьи без влияния (нулевые столбцы A) фиксируются
+       на нижнем пороге max(L, 0) и заменяются одной нулевой
+       статьей-остатком с порогом sum(max(L, 0)); пока расходы полезны,
+       она остается на пороге, а если покрытым статьям нужно меньше
+       бюджета, в нее уходит излишек — как и в исходной задаче;
+       при mu > 0 такие статьи штрафуются mu x_j^2, остаются в задаче
+       и становятся отдельными компонентами по одной статье;
+    2. строки-синглтоны — проблемы, связанные с одной статьей, —
+       сворачиваются аналитически: sum_i (a_ij x_j - y_i)^2 по таким
+       строкам статьи j равна h_j x_j^2 - 2 g_j x_j + const, то есть
+       одной строке sqrt(h_j)·e_j с целью g_j / sqrt(h_j);
+       пустые строки (константы) отбрасываются;
+    3. оставшиеся статьи разбиваются на связные компоненты по общим
+       проблемам: H = A'A блочно-диагональна, и компоненты связаны
+       только ограничением sum(x) = B; H = A'A + mu·I блочно-диагональна
+       при любом mu.
+
+    Возвращает dict:
+      cols   — индексы статей, оставшихся в задаче;
+      fixed  — индексы статей без влияния;
+      A, y   — сжатая задача (A — csr_matrix) по статьям cols и статье-остатку
+               последней, если fixed не пуст;
+      L      — нижние пороги сжатой задачи;
+      blocks — номер компоненты для каждой статьи сжатой задачи.
+    """
+    A = sp.csr_matrix(A, dtype=float)
+    A.eliminate_zeros()
+
+    impact = A.getnnz(axis=0) > 0 if mu == 0 else np.ones(A.shape[1], bool)
+    cols, fixed = np.flatnonzero(impact), np.flatnonzero(~impact)
+    A_c = A[:, cols]
+    k = len(cols)
+
+    row_nnz = A_c.getnnz(axis=1)
+    single, multi = row_nnz == 1, row_nnz > 1
+
+    # в строке-синглтоне ровно один ненулевой элемент
+    A_s = A_c[single]
+    j, a = A_s.indices, A_s.data
+    h = np.bincount(j, a * a, minlength=k)
+    g = np.bincount(j, a * y[single], minlength=k)
+    linked = np.flatnonzero(h > 0)
+    sqrt_h = np.sqrt(h[linked])
+    A_single = sp.csr_matrix((sqrt_h, (np.arange(len(linked)), linked)), shape=(len(linked), k))
+
+    # компоненты: статьи связаны, если входят в одну проблему
+    A_m = A_c[multi]
+    incidence = sp.csr_matrix((np.ones(A_m.nnz, dtype=np.int64), A_m.indices, A_m.indptr), shape=A_m.shape)
+    n_blocks, blocks = connected_components(incidence.T @ incidence, directed=False)
+
+    A_r = sp.vstack([A_m, A_single], format="csr")
+    L_r = np.maximum(L[cols], 0.0)
+    if len(fixed):
+        A_r = sp.hstack([A_r, sp.csr_matrix((A_r.shape[0], 1))], format="csr")
+        L_r = np.append(L_r, np.maximum(L[fixed], 0.0).sum())
+        blocks = np.append(blocks, n_blocks)
+
+    return {
+        "cols": cols,
+        "fixed": fixed,
+        "A": A_r,
+        "y": np.concatenate([y[multi], g[linked] / sqrt_h]),
+        "L": L_r,
+        "blocks": blocks,
+    }
+
+
+def postsolve_budget(pre, x_reduced, L):
+    """Распределение по всем статьям из решения сжатой задачи presolve_budget"""
+    cols, fixed = pre["cols"], pre["fixed"]
+
+    x = np.empty(len(cols) + len(fixed))
+    x[cols] = x_reduced[:len(cols)]
+    if len(fixed):
+        lb = np.maximum(L[fixed], 0.0)
+        x[fixed] = lb + (x_reduced[-1] - lb.sum()) / len(fixed)
+    return x
+
+
+def distribute_budget_presolved(c, B, L, A, mu=0.0):
+    """
+    distribute_budget (метод активного набора) после presolve_budget:
+    солвер видит только статьи с влиянием (при mu = 0) и свернутые
+    синглтоны, а KKT-системы решаются по связным компонентам.
+
+    Presolve рассчитан только на квадратичную цель distribute_budget,
+    другие распределители реестра получают исходную задачу.
+
+    Возвращает распределение по всем статьям либо None.
+    """
+    y = c / c.sum() * B
+    pre = presolve_budget(A, y, L, mu)
+
+    x = solve_budget_qp(pre["A"], pre["y"], B, pre["L"], mu, blocks=pre["blocks"])
+    if x is None:
+        return None
+    return postsolve_budget(pre, x, L)
+
+
+def _project_simplex(v, R):
+    """Евклидова проекция v на симплекс {z >= 0, sum(z) = R} сортировкой, O(m log m)"""
+    if R <= 0:
+        return np.zeros_like(v)
+    u = np.sort(v)[::-1]
+    css = np.cumsum(u) - R
+    rho = np.flatnonzero(u * np.arange(1, len(u) + 1) > css)[-1]
+    return np.maximum(v - css[rho] / (rho + 1), 0.0)
+
+
+def _spectral_norm_sq(op, iters=100, tol=1e-8, seed=0):
+    """Оценка ||A||^2 степенным методом на A'A — только произведения с A и A'"""
+    v = np.random.default_rng(seed).random(op.shape[1])
+    v /= np.linalg.norm(v)
+    s = 0.0
+    for _ in range(iters):
+        v = op.rmatvec(op.matvec(v))
+        s_new = np.linalg.norm(v)
+        if s_new == 0:
+            return 0.0
+        v /= s_new
+        if abs(s_new - s) <= tol * s_new:
+            return s_new
+        s = s_new
+    return s
+
+
+def solve_budget_fista(A, y, B, L, mu=0.0, tol=1e-6, max_iter=10000, check_every=10, x0=None):
+    """
+    Матрично-свободное решение задачи distribute_budget для очень больших A:
+        min ||A x - y||^2 + mu ||x||^2   при   sum(x) = B,  x >= max(L, 0).
+
+    Ускоренный проксимальный градиент (FISTA) с адаптивным рестартом:
+    проекция на допустимое множество — сдвинутый симплекс, шаг 1/Lip,
+    где Lip = 2(||A||^2 + mu) оценивается степенным методом. Нужны только
+    произведения A @ x и A.T @ r, поэтому A может быть scipy.sparse,
+    np.memmap или LinearOperator; память — O(n + m), без A'A.
+
+    Остановка по сертификату зазора двойственности Франк-Вульфа:
+        gap = ∇f(x)'(x - lb) - (B - sum(lb)) · min ∇f(x)  >=  f(x) - f*,
+    проверяемому раз в check_every итераций; критерий
+    gap <= tol · max(f(x), ||y||^2).
+
+    x0 — начальная точка (например, решение похожего отчета).
+
+    Возвращает (x, info) с info = {"iterations", "gap", "objective",
+    "converged"}; x допустим на любой итерации. None, если нижние
+    пороги не помещаются в бюджет.
+    """
+    op = aslinearoperator(A)
+    m = op.shape[1]
+    lb = np.maximum(L, 0.0)
+    R = B - lb.sum()
+    if R < 0:
+        return None
+
+    lip = 2 * (1.01 * _spectral_norm_sq(op) + mu)
+    scale = y @ y
+
+    x = lb + (np.full(m, R / m) if x0 is None else _project_simplex(x0 - lb, R))
+    Ax = op.matvec(x)
+    if R == 0 or lip == 0:
+        # допустимая точка единственна (R = 0) или цель постоянна (A = 0, mu = 0)
+        r = Ax - y
+        return x, {"iterations": 0, "gap": 0.0, "objective": r @ r + mu * x @ x, "converged": True}
+
+    step = 1.0 / lip
+    w, Aw, t = x, Ax, 1.0
+    gap = f = np.inf
+
+    for it in range(1, max_iter + 1):
+        g = 2 * op.rmatvec(Aw - y) + 2 * mu * w
+        x_new = lb + _project_simplex(w - step * g - lb, R)
+        Ax_new = op.matvec(x_new)
+
+        # рестарт, если шаг развернулся против инерции
+        if (w - x_new) @ (x_new - x) > 0:
+            t = 1.0
+        t_new = (1 + np.sqrt(1 + 4 * t * t)) / 2
+        beta = (t - 1) / t_new
+        # A w получается линейной комбинацией, без лишнего произведения
+        w = x_new + beta * (x_new - x)
+        Aw = Ax_new + beta * (Ax_new - Ax)
+        x, Ax, t = x_new, Ax_new, t_new
+
+        if it % check_every == 0 or it == max_iter:
+            r = Ax - y
+            gx = 2 * op.rmatvec(r) + 2 * mu * x
+            f = r @ r + mu * x @ x
+            gap = gx @ (x - lb) - R * gx.min()
+            if gap <= tol * max(f, scale):
+                break
+
+    return x, {"iterations": it, "gap": gap, "objective": f, "converged": bool(gap <= tol * max(f, scale))}
+
+
+def _solve_budget_cvxpy(A, y, B, L, mu, solver):
+    """Решение задачи distribute_budget через кэшированную задачу cvxpy"""
+    n, m = A.shape
+
+    problem, x, params = _compiled_budget_problem(n, m, solver)
+    params["A"].value = A
+    params["y"].value = y
+    params["B"].value = B
+    params["L"].value = L
+    params["mu"].value = mu
+
     # Решение задачи
-    problem.solve(solver=cp.OSQP)
+    problem.solve(solver=solver, warm_start=True)
     # problem.solve(verbose=True)
 
     # Проверка статуса решения
     if problem.status in [cp.OPTIMAL, cp.OPTIMAL_INACCURATE]:
-        x_v = x.value
-        e = A @ x_v - y
+        return x.value.copy()
+    return None
 
-        mae = np.mean(np.abs(e))
-        mse = np.mean(e ** 2)
-        rmse = np.sqrt(np.mean(e ** 2))
 
-        return x_v, mae, mse, rmse
-    else:
+def _budget_allocation(c, B, L, A, mu=0.0, solver="active_set"):
+    """
+    Распределение distribute_budget без метрик; None, если задача не решена.
+    Для solver="fista" — (x, info) solve_budget_fista, чтобы allocate
+    отдавал итерации, зазор и признак сходимости.
+    """
+    y = c / c.sum() * B
+
+    if solver == "fista":
+        return solve_budget_fista(A, y, B, L, mu)
+
+    x_v = None
+    if solver == "active_set":
+        x_v = solve_budget_qp(A, y, B, L, mu)
+        # запасной вариант
+        solver = cp.OSQP
+    if x_v is None:
+        x_v = _solve_budget_cvxpy(A, y, B, L, mu, solver)
+    return x_v
+
+
+def distribute_budget(c, B, L, A, mu=0.0, solver="active_set"):
+    """
+    Распределяет бюджетные средства на основе частоты упоминаний проблем и нижних пороговых ограничений.
+
+    По умолчанию задача решается методом активного набора (solve_budget_qp);
+    если он не сошелся, используется cvxpy + OSQP. Любой другой solver
+    (cp.OSQP, cp.CLARABEL, ...) решает задачу через cvxpy — например,
+    для перекрестной проверки. Задача cvxpy берётся из кэша
+    _compiled_budget_problem, поэтому повторные вызовы с той же
+    размерностью не канонизируют её заново, а OSQP стартует
+    с предыдущего решения. solver="fista" — матрично-свободный
+    solve_budget_fista для разреженных A, которым не по силам ни A'A,
+    ни канонизация cvxpy; если он не сошелся за max_iter итераций,
+    выдается RuntimeWarning (решение при этом допустимо).
+
+    Параметры:
+    c (np.array): частоты упоминаний проблем
+    B (float): общий бюджет
+    L (np.array): нижние пороговые ограничения для статей расходов
+    A (np.array): матрица коэффициентов связи между проблемами и статьями расходов
+    mu (float): коэффициент L2-регуляризации
+    solver (str): "active_set", "fista" или солвер cvxpy
+
+    Возвращает:
+    np.array: оптимальное распределение бюджета по статьям расходов
+    """
+    # y = c / c.sum()
+    y = c / c.sum() * B
+
+    x_v = _budget_allocation(c, B, L, A, mu, solver)
+    if x_v is None:
         return None
-    
-    
-def dp_budget_allocation(c, B, L, A, K=100):
+    if isinstance(x_v, tuple):
+        x_v, info = x_v
+        if not info["converged"]:
+            warnings.warn(f"FISTA не сошелся (итераций: {info['iterations']}, зазор {info['gap']:.3g}); "
+                          "решение допустимо, но не оптимально",
+                          RuntimeWarning, stacklevel=2)
+
+    return (x_v, *allocation_metrics(A, x_v, y)[:3])
+
+
+def _dp_layer_shift(prev, y_j, d, qmin):
     """
-    Приближение L2‑задачи через DP с дискретизацией:
-      x_j = k_j * δ,  δ = B/K,  sum k_j = K.
+    Один слой DP как min-plus свёртка через сдвиги массивов:
+      cur[k] = min_{q >= qmin} prev[k - q] + (q*d - y_j)^2.
 
-    Возвращает вектор x длины m.
+    Цикл идёт только по q, по k всё векторизовано. При равных значениях
+    выбирается наименьшее q (как в исходном переборе).
     """
+    K = len(prev) - 1
+    cur = np.full(K + 1, np.inf)
+    arg = np.zeros(K + 1, int)
+
+    for q in range(qmin, K + 1):
+        val = prev[:K + 1 - q] + (q * d - y_j) ** 2
+        better = val < cur[q:]
+        cur[q:][better] = val[better]
+        arg[q:][better] = q
+
+    return cur, arg
+
+
+def _dp_parents_shift(y_art, d, kmin, K):
+    """Таблица back‑pointer'ов для DP через сдвиги (произвольная стоимость)."""
+    m = len(y_art)
+    dp = np.full(K + 1, np.inf)
+    dp[0] = 0
+    parent = np.zeros((m + 1, K + 1), int)
+
+    for j in range(1, m + 1):
+        dp, parent[j] = _dp_layer_shift(dp, y_art[j - 1], d, kmin[j - 1])
+
+    return parent
+
+
+def _merge_slopes(slopes, g_slopes, size):
+    """
+    Слияние двух отсортированных массивов приращений через searchsorted,
+    первые size элементов. При равенстве первыми идут slopes.
+
+    Возвращает (merged, taken): taken[t] — сколько элементов g_slopes
+    среди первых t слитых.
+    """
+    pos = np.arange(len(g_slopes)) + np.searchsorted(slopes, g_slopes, side="right")
+    is_g = np.zeros(len(slopes) + len(g_slopes), bool)
+    is_g[pos] = True
+
+    merged = np.empty(len(is_g))
+    merged[is_g] = g_slopes
+    merged[~is_g] = slopes
+
+    taken = np.zeros(size + 1, int)
+    np.cumsum(is_g[:size], out=taken[1:])
+    return merged[:size], taken
+
+
+def _dp_layer_window(prev, cost, lo_prev, hi_prev, qmin, center, rtol):
+    """
+    Точный слой DP вокруг приближенного оптимума center[k]:
+      cur[k] = min_q prev[k - q] + cost[q],
+      q ∈ [max(qmin, k - hi_prev), k - lo_prev],
+    где [lo_prev, hi_prev] — область, на которой prev конечен,
+    с теми же округлениями и тем же выбором наименьшего q при равенстве,
+    что и полный перебор.
+
+    Цель выпукла по q с точностью до ошибок округления, поэтому если
+    значения на краях окна больше минимума внутри с запасом rtol,
+    вне окна оптимума нет. Для k, где это не так (плато из равных
+    значений шире окна), окно удваивается.
+    """
+    K = len(prev) - 1
+    cur = np.full(K + 1, np.inf)
+    arg = np.zeros(K + 1, int)
+
+    ks = np.arange(lo_prev + qmin, K + 1)
+    qc = center[ks]
+    r = 2
+    while len(ks):
+        qlow, qmax = np.maximum(qmin, ks - hi_prev), ks - lo_prev
+        Q = qc[:, None] + np.arange(-r, r + 1)
+        valid = (Q >= qlow[:, None]) & (Q <= qmax[:, None])
+        Qv = np.clip(Q, qlow[:, None], qmax[:, None])
+        vals = np.where(valid, prev[ks[:, None] - Qv] + cost[Qv], np.inf)
+
+        i = np.argmin(vals, axis=1)
+        vmin = vals[np.arange(len(ks)), i]
+        left_ok = (Q[:, 0] <= qlow) | (vals[:, 0] - vmin > rtol * vals[:, 0])
+        right_ok = (Q[:, -1] >= qmax) | (vals[:, -1] - vmin > rtol * vals[:, -1])
+        done = left_ok & right_ok
+
+        cur[ks[done]] = vmin[done]
+        arg[ks[done]] = Q[done, i[done]]
+        ks, qc = ks[~done], qc[~done]
+        r *= 2
+
+    return cur, arg
+
+
+def _dp_parents_convex(y_art, d, kmin, K):
+    """
+    Таблица back‑pointer'ов для DP с выпуклой стоимостью (q*d - y_j)^2.
+
+    Min-plus свёртка выпуклых последовательностей сводится к слиянию
+    их отсортированных приращений d(2qd + d - 2y_j) (_merge_slopes):
+    храним начало области определения lo и приращения dp[j, lo:] (slopes),
+    и число приращений статьи j среди первых k - lo слитых дает
+    оптимальное q(k) в точной арифметике.
+
+    В плавающей точке равные стоимости могут разрешаться иначе, чем
+    в исходном переборе, поэтому q(k) служит только центром окна,
+    в котором _dp_layer_window повторяет сравнения перебора. Окно
+    расширяется лишь на плато из почти равных значений, так что слой
+    стоит O(K) (не считая двоичного поиска в searchsorted), а ks
+    совпадают с исходным тройным циклом.
+    """
+    m = len(y_art)
+    parent = np.zeros((m + 1, K + 1), int)
+    dp = np.full(K + 1, np.inf)
+    dp[0] = 0
+    lo = 0
+    slopes = np.empty(0)
+    center = np.zeros(K + 1, int)
+    q_all = np.arange(K + 1)
+
+    for j in range(1, m + 1):
+        qmin = kmin[j - 1]
+        if lo + qmin > K:
+            # нижние пороги не помещаются в бюджет — дальше dp = inf
+            break
+        y_j = y_art[j - 1]
+
+        q = np.arange(qmin, K - lo)
+        g_slopes = d * (2 * q * d + d - 2 * y_j)
+        slopes, taken = _merge_slopes(slopes, g_slopes, K - lo - qmin)
+        center[lo + qmin:] = qmin + taken
+
+        # запас на ошибки округления, накопленные за j слоев
+        rtol = 16 * (j + 2) * np.finfo(float).eps
+        # dp[0] конечен только в точке 0, дальнейшие слои — на [lo, K]
+        hi = 0 if j == 1 else K
+        dp, parent[j] = _dp_layer_window(dp, (q_all * d - y_j) ** 2, lo, hi, qmin, center, rtol)
+        lo += qmin
+
+    return parent
+
+
+def _dp_allocation(c, B, L, A, K=100, method="convex"):
+    """Распределение dp_budget_allocation без метрик"""
     n, m = A.shape
     # 1) Целевые абсолютные расходы по проблемам
     y = (c / c.sum()) * B
@@ -347,21 +1353,13 @@ def dp_budget_allocation(c, B, L, A, K=100):
     # минимум гранул на j-ю статью
     kmin = np.ceil(L/d).astype(int)
 
-    # DP таблица
-    dp = np.full((m+1, K+1), np.inf)
-    dp[0,0] = 0
     # back‑pointer
-    parent = np.zeros((m+1, K+1), int)
-
-    for j in range(1, m+1):
-        for k in range(K+1):
-            for q in range(kmin[j-1], k+1):
-                prev = dp[j-1, k-q]
-                cost = (q*d - y_art[j-1])**2
-                val = prev + cost
-                if val < dp[j, k]:
-                    dp[j, k] = val
-                    parent[j, k] = q
+    if method == "convex":
+        parent = _dp_parents_convex(y_art, d, kmin, K)
+    elif method == "shift":
+        parent = _dp_parents_shift(y_art, d, kmin, K)
+    else:
+        raise ValueError(f"Неизвестный метод DP: {method}")
 
     # восстанавливаем k_j
     k = K
@@ -372,15 +1370,709 @@ def dp_budget_allocation(c, B, L, A, K=100):
         k -= q
 
     # финальное распределение
-    x = ks * d
+    return ks * d
+
+
+def dp_budget_allocation(c, B, L, A, K=100, method="convex"):
+    """
+    Приближение L2‑задачи через DP с дискретизацией:
+      x_j = k_j * δ,  δ = B/K,  sum k_j = K.
+
+    method:
+      "convex" — слияние приращений выпуклой стоимости и точный пересчет
+                 в окне вокруг оптимума, O(m·K) не считая двоичного поиска
+                 в searchsorted; ks те же, что у "shift";
+      "shift"  — min-plus свёртка через сдвиги массивов, O(m·K²) в NumPy.
+
+    Возвращает (x, mae, mse, rmse).
+    """
+    x = _dp_allocation(c, B, L, A, K, method)
+
+    y = (c / c.sum()) * B
+    return (x, *allocation_metrics(A, x, y)[:3])
+
+
+def _greedy_separable(y_art, d, kmin, extra):
+    """
+    Раздача extra гранул по сепарабельной стоимости sum_j (k_j d - y_j)^2.
+    Приращение статьи Δ_j(k) = d (2kd + d - 2y_j) растет по k, поэтому
+    жадный выбор наименьшего приращения из кучи дает тот же оптимум, что DP.
+    При равных приращениях гранула уходит статье с меньшим индексом.
+    """
+    ks = kmin.tolist()
+    y_art = y_art.tolist()
+    heap = [(d * (2 * k * d + d - 2 * y_j), j) for j, (k, y_j) in enumerate(zip(ks, y_art))]
+    heapq.heapify(heap)
+
+    for _ in range(extra):
+        j = heap[0][1]
+        ks[j] += 1
+        heapq.heapreplace(heap, (d * (2 * ks[j] * d + d - 2 * y_art[j]), j))
+
+    return np.array(ks)
+
+
+def _greedy_coupled(A, y, d, kmin, extra):
+    """
+    Раздача extra гранул по настоящей цели ||A x - y||^2 с ленивым
+    пересчетом приращений: Δ_j = 2d a_j'r + d^2 ||a_j||^2, r = A x - y.
+
+    Гранула статьи j меняет приращения остальных на 2d^2 a_i'a_j, что
+    при A >= 0 неотрицательно: устаревшие значения в куче — нижние оценки,
+    и пересчитывать достаточно только вершину, пока она не останется
+    наименьшей. Это точный жадный шаг, но не оптимум целочисленной
+    задачи: гранулы, отданные рано, уже не снимаются, и от порогов kmin
+    жадный путь может уйти далеко от оптимума (см. greedy_budget_allocation).
+    """
+    AT = np.ascontiguousarray(A.T)
+    col_sq = np.einsum("ij,ij->i", AT, AT)
+    r = A @ (kmin * d) - y
+    ks = kmin.copy()
+
+    gains = 2 * d * (AT @ r) + d * d * col_sq
+    heap = list(zip(gains.tolist(), range(len(ks))))
+    heapq.heapify(heap)
+
+    for _ in range(extra):
+        while True:
+            _, j = heapq.heappop(heap)
+            gain = 2 * d * (AT[j] @ r) + d * d * col_sq[j]
+            if not heap or gain <= heap[0][0]:
+                break
+            heapq.heappush(heap, (gain, j))
+
+        ks[j] += 1
+        r += d * AT[j]
+        heapq.heappush(heap, (2 * d * (AT[j] @ r) + d * d * col_sq[j], j))
+
+    return ks
+
+
+def _greedy_allocation(c, B, L, A, K=100, coupled=False):
+    """Распределение greedy_budget_allocation без метрик; None, если пороги не помещаются в бюджет"""
+    y = (c / c.sum()) * B
+    d = B / K
+    kmin = np.ceil(L / d).astype(int)
+    extra = K - kmin.sum()
+    if extra < 0:
+        return None
+
+    if coupled:
+        ks = _greedy_coupled(A, y, d, kmin, extra)
+    else:
+        ks = _greedy_separable(A.T @ y, d, kmin, extra)
+    return ks * d
+
+
+def greedy_budget_allocation(c, B, L, A, K=100, coupled=False):
+    """
+    Гранулярное распределение x_j = k_j δ, δ = B/K, sum k_j = K
+    жадной раздачей гранул через кучу за O(K log m).
+
+    coupled=False — та же сепарабельная цель, что у dp_budget_allocation
+    (sum_j (x_j - (A'y)_j)^2), и тот же оптимум, но без таблицы m×K,
+    так что годится и для K = 10⁶;
+    coupled=True — настоящая цель ||A x - y||^2 с ленивым пересчетом
+    приращений (см. _greedy_coupled). Это эвристика без гарантий: при
+    K = 10⁴ цель выше непрерывного оптимума solve_budget_qp в 30 раз
+    на бенчмарке 6x15 (R² 0.81 против 0.99) и на 38% на 10x15.
+    Близкое к оптимуму гранулярное решение для этой цели дает
+    rounded_budget_allocation, которая стартует с округления QP.
+
+    Возвращает (x, mae, mse, rmse) либо None, если нижние пороги
+    не помещаются в бюджет.
+    """
+    x = _greedy_allocation(c, B, L, A, K, coupled)
+    if x is None:
+        return None
+
+    y = (c / c.sum()) * B
+    return (x, *allocation_metrics(A, x, y)[:3])
+
+
+def _granule_swaps(A, y, d, ks, kmin, max_swaps):
+    """
+    Локальный поиск по переносу одной гранулы i -> j для цели ||A x - y||^2.
+
+    Изменение цели при переносе
+        Δ_ij = g_j - g_i + d^2 (G_ii + G_jj - 2 G_ij),  g = 2d A'r,  G = A'A,
+    считается сразу для всех пар; применяется лучший перенос, пока он
+    уменьшает цель. Результат оптимален относительно одиночных переносов.
+    """
+    G = A.T @ A
+    diag = np.diag(G)
+    pair = d * d * (diag[:, None] + diag[None, :] - 2 * G)
+    r = A @ (ks * d) - y
+
+    for _ in range(max_swaps):
+        g = 2 * d * (A.T @ r)
+        delta = g[None, :] - g[:, None] + pair
+        # отдавать гранулу может только статья выше порога
+        delta[ks <= kmin] = np.inf
+        i, j = np.unravel_index(np.argmin(delta), delta.shape)
+        if delta[i, j] >= -1e-12 * max(r @ r, 1.0):
+            break
+        ks[i] -= 1
+        ks[j] += 1
+        r += d * (A[:, j] - A[:, i])
+
+    return ks
+
+
+def _drop_granules(A, y, d, ks, kmin, count):
+    """
+    Снятие count гранул со статей выше порога kmin по цели ||A x - y||^2:
+    каждый раз снимается гранула с наименьшим ростом цели
+    Δ_j = -2d a_j'r + d^2 ||a_j||^2, r = A x - y.
+    """
+    col_sq = np.einsum("ij,ij->j", A, A)
+    r = A @ (ks * d) - y
+    ks = ks.copy()
+
+    for _ in range(count):
+        loss = -2 * d * (A.T @ r) + d * d * col_sq
+        loss[ks <= kmin] = np.inf
+        j = np.argmin(loss)
+        ks[j] -= 1
+        r -= d * A[:, j]
+
+    return ks
+
+
+def _rounded_allocation(c, B, L, A, K=100, max_swaps=None):
+    """Распределение rounded_budget_allocation без метрик"""
+    y = (c / c.sum()) * B
+    d = B / K
+    kmin = np.ceil(L / d).astype(int)
+    extra = K - kmin.sum()
+    if extra < 0:
+        return None
+
+    # непрерывный оптимум с порогами, кратными грануле: x_j = k_j d >= L_j
+    # означает k_j >= kmin_j, так что округлять нужно именно его
+    x = solve_budget_qp(A, y, B, kmin * d)
+    if x is None:
+        ks = kmin
+    else:
+        # округление вниз, с которого жадно раздается остаток; подъем
+        # до порога kmin (L не кратно d) может дать больше K гранул —
+        # лишние снимаются там, где это дешевле всего
+        ks = np.maximum(np.floor(x / d + 1e-9).astype(int), kmin)
+        if ks.sum() > K:
+            ks = _drop_granules(A, y, d, ks, kmin, ks.sum() - K)
+    ks = _greedy_coupled(A, y, d, ks, K - ks.sum())
+
+    if max_swaps is None:
+        max_swaps = 10 * A.shape[1] + K
+    return _granule_swaps(A, y, d, ks, kmin, max_swaps) * d
+
+
+def rounded_budget_allocation(c, B, L, A, K=100, max_swaps=None):
+    """
+    Гранулярное распределение x_j = k_j δ, δ = B/K, sum k_j = K для
+    настоящей цели ||A x - y||^2, а не сепарабельной замены DP.
+
+    Непрерывный оптимум solve_budget_qp с порогами kmin·d, kmin = ceil(L/δ),
+    округляется вниз до гранул (если из-за округления вышло больше K гранул,
+    лишние снимаются _drop_granules), остаток раздается ленивым жадным методом (_greedy_coupled), после чего
+    локальный поиск переносит гранулы между статьями, пока это уменьшает
+    цель (_granule_swaps).
+
+    Когда L не кратно δ, пороги гранул kmin·δ выше L, и цель неизбежно
+    выше непрерывного оптимума с порогами L (на бенчмарке 6x15 при
+    K = 10⁴ — на 3.6%); от оптимума с порогами kmin·δ результат
+    отличается на доли процента уже при K = 10³.
+
+    Возвращает (x, mae, mse, rmse) либо None, если нижние пороги
+    не помещаются в бюджет.
+    """
+    x = _rounded_allocation(c, B, L, A, K, max_swaps)
+    if x is None:
+        return None
+
+    y = (c / c.sum()) * B
+    return (x, *allocation_metrics(A, x, y)[:3])
+
+
+def _scaled_target_solve(AtA, Atc, cc, lb, R, lambda_reg, k_min, free=None, z0=None):
+    """
+    Ядро scaled_target_allocation по готовым A'A, A'c и c'c.
+
+    При фиксированном x оптимальный масштаб k = max(k_min, c'Ax / c'c).
+    Без ограничения k >= k_min он подставляется в цель, и остается
+    задача только по x с матрицей A'(I - cc'/c'c)A + λI — симплекс
+    _active_set_qp. Совместная задача выпукла, поэтому если найденный k
+    меньше k_min, оптимум лежит на границе k = k_min, и x находится
+    второй задачей того же вида с H = A'A + λI.
+
+    Возвращает (x, k, free, z) либо None, если метод не сошелся.
+    """
+    E = lambda_reg * np.eye(len(lb))
+
+    H = AtA - np.outer(Atc, Atc) / cc + E
+    solved = _active_set_qp(H, -H @ lb, R, free, z0=z0)
+    if solved is None and free is not None:
+        solved = _active_set_qp(H, -H @ lb, R)
+    if solved is None:
+        return None
+    z, free = solved
+    k = Atc @ (lb + z) / cc
+
+    if k < k_min:
+        H = AtA + E
+        b = k_min * Atc - H @ lb
+        solved = _active_set_qp(H, b, R, free, z0=z)
+        if solved is None:
+            solved = _active_set_qp(H, b, R)
+        if solved is None:
+            return None
+        z, free = solved
+        k = k_min
+
+    return lb + z, k, free, z
+
+
+def _scaled_target_allocation(c, B, L, A, lambda_reg=0.1, k_min=None):
+    """Распределение scaled_target_allocation без метрик; масштаб k — в info"""
+    lb = np.asarray(L, dtype=float)
+    R = B - lb.sum()
+    if R < 0:
+        return None
+    if k_min is None:
+        k_min = B / c.sum()
+
+    AtA = A.T @ A
+    if sp.issparse(AtA):
+        AtA = AtA.toarray()
+    solved = _scaled_target_solve(AtA, A.T @ c, c @ c, lb, R, lambda_reg, k_min)
+    if solved is None:
+        return None
+    x, k, _, _ = solved
+    return x, {"k": k}
+
+
+def scaled_target_allocation(c, B, L, A, lambda_reg=0.1, k_min=None):
+    """
+    Модель «масштабированной цели» (dp2.py) без ECOS:
+        min ||A x - k c||^2 + lambda_reg ||x||^2
+        при  sum(x) = B,  x >= L,  k >= k_min (по умолчанию B / sum(c)).
+
+    Переменная k исключается в замкнутом виде (_scaled_target_solve),
+    так что задача решается одним-двумя прогонами метода активного набора.
+
+    Возвращает (x, k, mae, mse, rmse) с ошибками относительно k·c
+    либо None, если задача несовместна.
+    """
+    out = _scaled_target_allocation(c, B, L, A, lambda_reg, k_min)
+    if out is None:
+        return None
+    x, info = out
+    return (x, info["k"], *allocation_metrics(A, x, info["k"] * c)[:3])
+
+
+def scaled_target_path(c, B, L, A, lambdas, k_min=None):
+    """
+    scaled_target_allocation для многих значений lambda_reg.
 
+    A'A, A'c и c'c считаются один раз, значения lambda_reg обходятся
+    по возрастанию, и каждая задача стартует со свободного набора и точки
+    предыдущей: соседние решения отличаются мало, поэтому обычно хватает
+    одной-двух KKT-систем.
+
+    Возвращает (X, ks): X[i] и ks[i] — распределение и масштаб для
+    lambdas[i] (NaN, если задача не решена), либо None, если нижние
+    пороги не помещаются в бюджет.
+    """
+    lambdas = np.asarray(lambdas, dtype=float)
+    lb = np.asarray(L, dtype=float)
+    R = B - lb.sum()
+    if R < 0:
+        return None
+    if k_min is None:
+        k_min = B / c.sum()
+
+    AtA, Atc, cc = A.T @ A, A.T @ c, c @ c
+    if sp.issparse(AtA):
+        AtA = AtA.toarray()
+    X = np.full((len(lambdas), len(lb)), np.nan)
+    ks = np.full(len(lambdas), np.nan)
+
+    free = z = None
+    for i in np.argsort(lambdas):
+        solved = _scaled_target_solve(AtA, Atc, cc, lb, R, lambdas[i], k_min, free, z)
+        if solved is None:
+            continue
+        X[i], ks[i], free, z = solved
+    return X, ks
+
+
+def allocation_metrics(A, x, y):
+    """Метрики качества распределения x: (mae, mse, rmse, r2)"""
     e = A @ x - y
 
     mae = np.mean(np.abs(e))
     mse = np.mean(e ** 2)
-    rmse = np.sqrt(np.mean(e ** 2))
+    rmse = np.sqrt(mse)
+    r2 = 1 - np.sum(e ** 2) / np.sum((y - np.mean(y)) ** 2)
+
+    return mae, mse, rmse, r2
+
+
+class AllocationResult:
+    """
+    Результат распределения любого метода из ALLOCATORS.
+
+    x — распределение по статьям, info — служебные данные метода
+    (итерации, множители и т.п.). Метрики покрытия считаются одним вызовом
+    allocation_metrics при первом обращении к mae/mse/rmse/r2 и запоминаются,
+    так что результаты, метрики которых никто не читает, ничего не стоят.
+
+    Распаковывается как кортеж пакетного решения: x, mae, mse, rmse, r2 = result.
+    """
+    __slots__ = ("method", "x", "info", "_A", "_y", "_metrics")
+
+    def __init__(self, method, x, A, y, info=None):
+        self.method = method
+        self.x = x
+        self.info = info
+        self._A = A
+        self._y = y
+        self._metrics = None
+
+    def _get_metrics(self):
+        if self._metrics is None:
+            self._metrics = allocation_metrics(self._A, self.x, self._y)
+        return self._metrics
+
+    @property
+    def mae(self):
+        return self._get_metrics()[0]
+
+    @property
+    def mse(self):
+        return self._get_metrics()[1]
+
+    @property
+    def rmse(self):
+        return self._get_metrics()[2]
+
+    @property
+    def r2(self):
+        return self._get_metrics()[3]
+
+    def metrics(self):
+        """Все метрики словарем"""
+        return dict(zip(("mae", "mse", "rmse", "r2"), self._get_metrics()))
+
+    def __iter__(self):
+        return iter((self.x, *self._get_metrics()))
+
+    def __repr__(self):
+        return f"AllocationResult(method={self.method!r}, x={np.round(self.x, 2)})"
+
+
+# Реестр распределителей: имя -> функция fn(c, B, L, A, **kwargs),
+# возвращающая x, (x, info) или None, если задача не решена
+ALLOCATORS = {}
+
+
+def register_allocator(name):
+    """Декоратор: добавляет распределитель в ALLOCATORS под именем name"""
+    def decorator(fn):
+        ALLOCATORS[name] = fn
+        return fn
+    return decorator
+
+
+def allocate(method, c, B, L, A, **kwargs):
+    """
+    Распределение бюджета методом из реестра с единой сигнатурой.
+
+    Параметры:
+    method (str): имя метода в ALLOCATORS
+    c, B, L, A: как в distribute_budget
+    kwargs: параметры метода (mu, K, solver, ...)
+
+    Возвращает:
+    AllocationResult либо None, если задача не решена
+    """
+    try:
+        fn = ALLOCATORS[method]
+    except KeyError:
+        raise ValueError(f"Неизвестный метод распределения: {method}") from None
+
+    out = fn(c, B, L, A, **kwargs)
+    if out is None:
+        return None
+    x, info = out if isinstance(out, tuple) else (out, None)
+    if x is None:
+        return None
+
+    return AllocationResult(method, x, A, c / c.sum() * B, info)
+
+
+register_allocator("distribute_budget")(_budget_allocation)
+register_allocator("dp_budget_allocation")(_dp_allocation)
+register_allocator("distribute_budget_presolved")(distribute_budget_presolved)
+register_allocator("greedy_budget_allocation")(_greedy_allocation)
+register_allocator("rounded_budget_allocation")(_rounded_allocation)
+register_allocator("scaled_target_allocation")(_scaled_target_allocation)
+
+
+def allocation_key(method, c, B, L, A, **kwargs):
+    """
+    Хэш содержимого задачи: sha256 по (A, c, L, B, method, kwargs).
+    Массивы хэшируются вместе с формой и dtype, поэтому отчет с теми же
+    частотами и связями дает тот же ключ, а любое изменение problem_item
+    или problem_budget_link — новый.
+    """
+    # массивы среди kwargs (веса p, w, ...) хэшируются по содержимому, не по repr
+    arrays = [A, c, L]
+    params = []
+    for name, value in sorted(kwargs.items()):
+        if isinstance(value, np.ndarray) or sp.issparse(value):
+            arrays.append(value)
+            value = np.ndarray
+        params.append((name, value))
+
+    h = hashlib.sha256()
+    h.update(repr((method, float(B), params)).encode())
+    for arr in arrays:
+        arr = np.ascontiguousarray(arr.toarray() if sp.issparse(arr) else arr)
+        h.update(repr((arr.shape, arr.dtype.str)).encode())
+        h.update(arr.tobytes())
+    return h.hexdigest()
+
+
+class AllocationCache:
+    """
+    Постоянный кэш результатов allocate в SQLite.
+
+    Ключ — allocation_key, значение — (x, info) в pickle. При превышении
+    max_bytes вытесняются записи, которые дольше всего не читались.
+    path=":memory:" — кэш только на время процесса.
 
-    return x, mae, mse, rmse
+        cache = AllocationCache("allocations.sqlite")
+        result = cache.allocate("distribute_budget", c, B, L, A)
+    """
+
+    def __init__(self, path="allocations.sqlite", max_bytes=256 * 2 ** 20):
+        self.max_bytes = max_bytes
+        self._conn = sqlite3.connect(path)
+        self._conn.execute("""
+                           CREATE TABLE IF NOT EXISTS allocation_cache (
+                               key       TEXT PRIMARY KEY,
+                               value     BLOB NOT NULL,
+                               size      INTEGER NOT NULL,
+                               last_used REAL NOT NULL
+                           )
+                           """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS allocation_cache_lru ON allocation_cache (last_used)")
+        self._conn.commit()
+
+    def get(self, key):
+        """(x, info) по ключу либо None"""
+        row = self._conn.execute("SELECT value FROM allocation_cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        self._conn.execute("UPDATE allocation_cache SET last_used = ? WHERE key = ?", (time.time(), key))
+        self._conn.commit()
+        return pickle.loads(row[0])
+
+    def put(self, key, x, info=None):
+        value = pickle.dumps((x, info), protocol=pickle.HIGHEST_PROTOCOL)
+        self._conn.execute("INSERT OR REPLACE INTO allocation_cache VALUES (?, ?, ?, ?)",
+                           (key, value, len(value), time.time()))
+        self._evict()
+        self._conn.commit()
+
+    def _evict(self):
+        """Удаляет самые давно читавшиеся записи, пока кэш больше max_bytes"""
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM allocation_cache").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = self._conn.execute("SELECT key, size FROM allocation_cache ORDER BY last_used").fetchall()
+        stale = []
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            stale.append((key,))
+            total -= size
+        self._conn.executemany("DELETE FROM allocation_cache WHERE key = ?", stale)
+
+    def allocate(self, method, c, B, L, A, **kwargs):
+        """allocate с кэшем: неизменившаяся задача не решается повторно"""
+        key = allocation_key(method, c, B, L, A, **kwargs)
+        cached = self.get(key)
+        if cached is not None:
+            x, info = cached
+            return AllocationResult(method, x, A, c / c.sum() * B, info)
+
+        result = allocate(method, c, B, L, A, **kwargs)
+        if result is not None:
+            self.put(key, result.x, result.info)
+        return result
+
+    def clear(self):
+        self._conn.execute("DELETE FROM allocation_cache")
+        self._conn.commit()
+
+    def close(self):
+        self._conn.close()
+
+    def __len__(self):
+        return self._conn.execute("SELECT COUNT(*) FROM allocation_cache").fetchone()[0]
+
+
+def _solve_report(task):
+    """Решение одной задачи пачки в процессе-воркере"""
+    method, (c, A, L, B), kwargs = task
+
+    if isinstance(method, str):
+        result = allocate(method, c, B, L, A, **kwargs)
+        return None if result is None else tuple(result)
+
+    result = method(c, B, L, A, **kwargs)
+    if result is None:
+        return None
+
+    x = result[0]
+    y = c / c.sum() * B
+    return (x, *allocation_metrics(A, x, y))
+
+
+def solve_reports_batch(problems, method=distribute_budget, max_workers=None, chunksize=4, **kwargs):
+    """
+    Решает пачку задач распределения, например все отчеты города.
+
+    Параметры:
+    problems (list): задачи [(c, A, L, B), ...]
+    method (callable | str): распределитель с сигнатурой method(c, B, L, A, **kwargs),
+                             например distribute_budget или dp_budget_allocation,
+                             либо имя метода в ALLOCATORS
+    max_workers (int): число процессов (None — по числу ядер, 1 — без пула)
+    chunksize (int): сколько задач отдается воркеру за раз
+    kwargs: дополнительные параметры method (mu, K, ...)
+
+    Каждый воркер держит свой кэш скомпилированных задач cvxpy, поэтому
+    отчеты одной размерности внутри воркера не канонизируются повторно.
+
+    Возвращает:
+    list: (x, mae, mse, rmse, r2) либо None для нерешенной задачи — в порядке problems
+    """
+    tasks = [(method, problem, kwargs) for problem in problems]
+
+    if max_workers == 1 or len(tasks) <= 1:
+        return [_solve_report(task) for task in tasks]
+
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        return list(pool.map(_solve_report, tasks, chunksize=chunksize))
+
+
+def get_city_tree(engine=None):
+    """Дерево городов из таблицы city: {city_id: (name, parent_id)}"""
+    engine = engine or get_engine()
+
+    query = text("""
+                 SELECT id, name, parent_id
+                 FROM city
+                 ORDER BY id
+                 """)
+
+    with engine.connect() as conn:
+        return {city_id: (name, parent_id) for city_id, name, parent_id in conn.execute(query)}
+
+
+def _city_children(tree):
+    """Дети каждого города и корни дерева (parent_id пуст или вне дерева)"""
+    children = {city_id: [] for city_id in tree}
+    roots = []
+    for city_id, (_, parent_id) in tree.items():
+        if parent_id in children:
+            children[parent_id].append(city_id)
+        else:
+            roots.append(city_id)
+    return children, roots
+
+
+def split_city_budget(tree, demand, B):
+    """
+    Делит бюджет региона B по дереву городов пропорционально спросу.
+
+    demand — {city_id: собственный спрос города} (например, сумма частот
+    проблем его отчетов). Суммарный спрос поддеревьев считается один раз
+    снизу вверх, затем бюджет спускается сверху вниз: город оставляет
+    себе долю собственного спроса, остальное делится между детьми
+    по спросу их поддеревьев. Несколько корней делят B как дети
+    общего виртуального корня.
+
+    Возвращает {city_id: собственный бюджет города}.
+    """
+    children, roots = _city_children(tree)
+
+    # порядок обхода сверху вниз; в обратном порядке дети идут раньше родителей
+    order = list(roots)
+    for city_id in order:
+        order.extend(children[city_id])
+
+    subtree = {}
+    for city_id in reversed(order):
+        subtree[city_id] = demand.get(city_id, 0.0) + sum(subtree[child] for child in children[city_id])
+
+    region = sum(subtree[city_id] for city_id in roots)
+    pending = {city_id: B * subtree[city_id] / region if region > 0 else B / len(roots)
+               for city_id in roots}
+
+    budgets = {}
+    for city_id in order:
+        total = pending.pop(city_id)
+        if subtree[city_id] > 0:
+            budgets[city_id] = total * demand.get(city_id, 0.0) / subtree[city_id]
+            for child in children[city_id]:
+                pending[child] = total * subtree[child] / subtree[city_id]
+        else:
+            # спроса в поддереве нет — бюджет остается у самого города
+            budgets[city_id] = total
+            for child in children[city_id]:
+                pending[child] = 0.0
+    return budgets
+
+
+def hierarchical_allocation(tree, city_problems, B, method="distribute_budget", max_workers=None, **kwargs):
+    """
+    Иерархическое распределение: бюджет региона B делится по дереву
+    городов (split_city_budget), затем в каждом городе решается задача
+    распределения по статьям.
+
+    Параметры:
+    tree (dict): {city_id: (name, parent_id)}, например из get_city_tree
+    city_problems (dict): {city_id: (c, A, L)} — частоты, матрица влияния
+                          и нижние пороги города (L = None — B_city / m / 5)
+    B (float): бюджет региона
+    method (str): метод из ALLOCATORS
+    max_workers (int): число процессов для задач городов (1 — без пула)
+
+    Спрос города — сумма его частот c. После спуска бюджетов задачи
+    городов независимы и решаются пачкой solve_reports_batch.
+
+    Возвращает:
+    (budgets, results): {city_id: бюджет города},
+                        {city_id: (x, mae, mse, rmse, r2) или None}
+    """
+    demand = {city_id: float(np.sum(c)) for city_id, (c, _, _) in city_problems.items()}
+    budgets = split_city_budget(tree, demand, B)
+
+    cities, problems = [], []
+    for city_id, (c, A, L) in city_problems.items():
+        B_city = budgets.get(city_id, 0.0)
+        if B_city <= 0:
+            continue
+        m = A.shape[1]
+        cities.append(city_id)
+        problems.append((c, A, np.full(m, B_city / m / 5) if L is None else L, B_city))
+
+    solved = solve_reports_batch(problems, method=method, max_workers=max_workers, **kwargs)
+    return budgets, dict(zip(cities, solved))
 
 
 # def perform_foundation_distribution(B, problem_report_id, distro_func=dp_budget_allocation, *distro_args):